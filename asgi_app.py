@@ -0,0 +1,303 @@
+"""
+Async (ASGI) serving mode for the comprehensive dashboard
+
+The read endpoints (/api/data, /api/stream, /api/search, /api/query) are served
+natively on the event loop, so idle pollers and SSE subscribers cost a coroutine
+instead of a worker thread. Every other route is forwarded to the Flask app in a
+thread pool.
+
+Run with:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+
+With --workers N, set SHARED_SNAPSHOT_DIR so the workers elect one refresher and
+share its snapshots.
+"""
+import asyncio
+import json
+import threading
+import time
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+import comprehensive_app as dashboard
+
+flask_app = WsgiToAsgi(dashboard.app)
+
+class SnapshotNotifier:
+    """Wake the stream coroutines of a sheet when the refresh thread publishes it
+
+    Events are only touched on the loop thread; a sheet's event is dropped once fired
+    and created again by the next subscriber that waits.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.events = {}  # sheet key -> asyncio.Event
+
+    def attach(self, loop):
+        self.loop = loop
+
+    def event(self, key):
+        event = self.events.get(key)
+        if event is None:
+            event = self.events[key] = asyncio.Event()
+        return event
+
+    def discard(self, key):
+        self.events.pop(key, None)
+
+    def publish(self, key, version):
+        # Called from the refresh thread
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._fire, key)
+
+    def _fire(self, key):
+        event = self.events.pop(key, None)
+        if event is not None:
+            event.set()
+
+notifier = SnapshotNotifier()
+
+def query_args(scope):
+    """First value of each query string argument"""
+    parsed = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return {name: values[0] for name, values in parsed.items()}
+
+def request_header(scope, name):
+    name = name.lower().encode('latin-1')
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def send_body(send, body, status=200, content_type=b'application/json', headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())] + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, payload, status=200, headers=()):
+    await send_body(send, json.dumps(payload).encode('utf-8'), status=status, headers=headers)
+
+def freshness_headers(tenant):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in dashboard.freshness_headers(tenant).items()]
+
+async def request_tenant(args):
+    """Resolve ?sheet= and mark the sheet as viewed
+    
+    Adopting another worker's snapshot parses it and updates the search index under
+    the snapshot locks, so that runs in the thread pool rather than on the loop.
+    """
+    tenant = dashboard.resolve_tenant(args.get('sheet'))
+    if tenant:
+        tenant.touch()
+        shared = dashboard.newer_shared_snapshot(tenant)
+        if shared is not None:
+            await asyncio.get_running_loop().run_in_executor(None, dashboard.adopt_shared_snapshot, tenant, shared)
+        dashboard.revalidate_in_background(tenant)
+    return tenant
+
+async def send_unknown_sheet(send):
+    await send_json(send, {'status': 'error', 'message': 'Invalid sheet URL'})
+
+async def send_expired(send):
+    await send_json(send, dashboard.expired_snapshot_body(), status=503,
+                    headers=[(b'retry-after', str(dashboard.REVALIDATE_RETRY_SECONDS).encode())])
+
+async def handle_data(scope, receive, send):
+    args = query_args(scope)
+    if args.get('at'):
+        # Time-travel reads hit the archive on disk; let Flask serve them in its thread pool
+        scope['forwarded'] = True
+        await flask_app(scope, receive, send)
+        return
+    tenant = await request_tenant(args)
+    if not tenant:
+        await send_unknown_sheet(send)
+        return
+
+    loop = asyncio.get_running_loop()
+    snapshot, version = dashboard.get_snapshot(tenant)
+    if snapshot is None:
+        # The first fetch runs in the background; clients retry shortly
+        await send_json(send, dashboard.cold_snapshot_body(tenant), headers=[(b'retry-after', b'2')])
+        return
+    if dashboard.snapshot_expired(tenant):
+        await send_expired(send)
+        return
+
+    etag = dashboard.snapshot_etag(tenant, version, 'data')
+    if request_header(scope, 'If-None-Match') == etag:
+        await send_body(send, b'', status=304, headers=[(b'etag', etag.encode('latin-1'))] + freshness_headers(tenant))
+        return
+
+    body = dashboard.peek_snapshot_artifact(tenant, 'data_json', version)
+    if body is None:
+        body = await loop.run_in_executor(
+            None, dashboard.get_snapshot_artifact, tenant, 'data_json', snapshot, version,
+            lambda data: dashboard.build_data_payload(data, version, tenant.last_update)
+        )
+    await send_body(send, body, headers=[(b'etag', etag.encode('latin-1'))] + freshness_headers(tenant))
+
+async def handle_search(scope, receive, send):
+    # Searches hold search_lock, which index updates take too; keep them off the loop
+    args = query_args(scope)
+    tenant = await request_tenant(args)
+    if not tenant:
+        await send_unknown_sheet(send)
+        return
+    if dashboard.snapshot_expired(tenant):
+        await send_expired(send)
+        return
+    try:
+        limit = int(args.get('limit', 20))
+    except ValueError:
+        limit = 20
+    loop = asyncio.get_running_loop()
+    body = await loop.run_in_executor(
+        None, dashboard.search_response, tenant, args.get('q', '').strip(), limit, args.get('fuzzy', '1') != '0'
+    )
+    await send_json(send, body, headers=freshness_headers(tenant))
+
+async def handle_query(scope, receive, send):
+    # Cold queries encode the snapshot columns, so keep them off the loop
+    args = query_args(scope)
+    tenant = await request_tenant(args)
+    if not tenant:
+        await send_unknown_sheet(send)
+        return
+    if dashboard.snapshot_expired(tenant):
+        await send_expired(send)
+        return
+    loop = asyncio.get_running_loop()
+    params = dashboard.query_params_from_args(args)
+    body, status = await loop.run_in_executor(None, dashboard.query_response, tenant, params)
+    await send_json(send, body, status=status, headers=freshness_headers(tenant))
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+async def handle_stream(scope, receive, send):
+    args = query_args(scope)
+    tenant = await request_tenant(args)
+    if not tenant:
+        await send_unknown_sheet(send)
+        return
+
+    since = request_header(scope, 'last-event-id') or args.get('since')
+    try:
+        last_seen = int(since) if since else tenant.version
+    except ValueError:
+        last_seen = tenant.version
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+    loop = asyncio.get_running_loop()
+    disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+    # Every stream in this mode runs on the loop thread, which is the only writer of
+    # the count; snapshot_condition is held while a new snapshot is installed
+    tenant.subscribers += 1
+    try:
+        while not disconnect.done():
+            # Take the event before checking so a publish in between still wakes us
+            event = notifier.event(tenant.key)
+            current, messages = await loop.run_in_executor(None, dashboard.stream_messages_since, tenant, last_seen)
+
+            if not messages:
+                update = asyncio.ensure_future(event.wait())
+                done, _ = await asyncio.wait(
+                    {update, disconnect},
+                    timeout=dashboard.STREAM_HEARTBEAT_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                update.cancel()
+                if not done:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+
+            for message in messages:
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+            last_seen = current
+    finally:
+        disconnect.cancel()
+        tenant.subscribers -= 1
+        if not tenant.subscribers:
+            notifier.discard(tenant.key)
+
+NATIVE_ROUTES = {
+    '/api/data': handle_data,
+    '/api/stream': handle_stream,
+    '/api/search': handle_search,
+    '/api/query': handle_query
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            notifier.attach(asyncio.get_running_loop())
+            dashboard.snapshot_listeners.append(notifier.publish)
+            if dashboard.shared_store is None:
+                # Warm the default sheet; with shared snapshots the elected leader does this
+                threading.Thread(target=dashboard.fetch_sheet_data, daemon=True).start()
+            dashboard.start_refresher()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def serve_native(handler, scope, receive, send):
+    """Run a native handler, recording it in the same request metrics as the Flask routes
+
+    Lock waits are not charged here: coroutines share the loop thread, so there is
+    no per-request place to charge them to.
+    """
+    start = time.perf_counter()
+    response = {'status': '500', 'size': 0, 'streaming': False}
+
+    async def recording_send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = str(message['status'])
+            response['streaming'] = any(name == b'content-type' and value.startswith(b'text/event-stream')
+                                        for name, value in message.get('headers', []))
+        elif message['type'] == 'http.response.body':
+            response['size'] += len(message.get('body', b''))
+        await send(message)
+
+    try:
+        await handler(scope, receive, recording_send)
+    finally:
+        # Requests handed on to Flask were recorded by its middleware
+        if not scope.get('forwarded'):
+            dashboard.request_metrics.record(
+                scope['path'], scope['method'], response['status'], time.perf_counter() - start, response['size'],
+                environ={'PATH_INFO': scope['path'], 'QUERY_STRING': scope.get('query_string', b'').decode('latin-1')},
+                streaming=response['streaming']
+            )
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    handler = NATIVE_ROUTES.get(scope.get('path'))
+    if scope['type'] == 'http' and scope['method'] == 'GET' and handler is not None:
+        await serve_native(handler, scope, receive, send)
+        return
+
+    await flask_app(scope, receive, send)
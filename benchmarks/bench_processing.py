@@ -0,0 +1,192 @@
+"""
+Parse / aggregate / serialize benchmark for the five dashboard app variants
+
+Each variant is fed the same synthetic sheet (see sheet_generator.py) through
+the path its fetch_sheet_data takes:
+
+    parse       CSV text -> what process_campaign_data expects (DataFrame or dict rows)
+    aggregate   process_campaign_data
+    serialize   the /api/data JSON body
+
+Timings are the best of --repeat runs. Peak memory is measured in a separate
+pass under tracemalloc, since tracing slows allocation-heavy code down. Variants
+whose dependencies are not installed (pandas, gspread, ...) are skipped.
+
+    python benchmarks/bench_processing.py --rows 100,10000,1000000
+    python benchmarks/bench_processing.py --json after.json --baseline before.json
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheet_generator import generate_csv
+
+DEFAULT_ROWS = '100,1000,10000,100000'
+STAGES = ('parse', 'aggregate', 'serialize')
+
+# Keep comprehensive_app's history, archive and time-series files out of the checkout
+os.environ.setdefault('HISTORY_DIR', tempfile.mkdtemp(prefix='bench-history-'))
+
+def parse_sheet_values(module, text):
+    """app.py: gspread get_all_values() rows turned into a DataFrame"""
+    values = list(csv.reader(StringIO(text)))
+    return module.pd.DataFrame(values[1:], columns=values[0])
+
+def parse_read_csv(module, text):
+    """simple_app.py: pandas.read_csv on the export"""
+    return module.pd.read_csv(StringIO(text))
+
+def parse_dict_rows(module, text):
+    """no_pandas_app.py, enhanced_app.py, comprehensive_app.py: csv.DictReader rows"""
+    return list(csv.DictReader(StringIO(text)))
+
+VARIANTS = {
+    'app': parse_sheet_values,
+    'simple_app': parse_read_csv,
+    'no_pandas_app': parse_dict_rows,
+    'enhanced_app': parse_dict_rows,
+    'comprehensive_app': parse_dict_rows,
+}
+
+def serialize(module, processed):
+    if hasattr(module, 'build_data_payload'):
+        return module.build_data_payload(processed, 1, datetime.now())
+    # The older variants jsonify the processed dict; numpy scalars need the default
+    return json.dumps({'data': processed, 'last_update': datetime.now().isoformat(), 'status': 'success'},
+                      default=str).encode('utf-8')
+
+def run_pipeline(module, parse, text, timer):
+    parsed = timer('parse', lambda: parse(module, text))
+    processed = timer('aggregate', lambda: module.process_campaign_data(parsed))
+    if processed is None:
+        raise RuntimeError('process_campaign_data returned None')
+    body = timer('serialize', lambda: serialize(module, processed))
+    return processed, body
+
+def time_variant(module, parse, text, repeat):
+    """Best wall time per stage over `repeat` runs, the processed result and the body size"""
+    best = dict.fromkeys(STAGES, float('inf'))
+
+    def timer(stage, work):
+        start = time.perf_counter()
+        result = work()
+        best[stage] = min(best[stage], time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        processed, body = run_pipeline(module, parse, text, timer)
+    return best, processed, len(body)
+
+def peak_memory(module, parse, text):
+    """Peak traced bytes of the whole pipeline, and per stage above what was live before it"""
+    peaks = {}
+    overall = [0]
+
+    def timer(stage, work):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = work()
+        peak = tracemalloc.get_traced_memory()[1]
+        peaks[stage] = peak - before
+        overall[0] = max(overall[0], peak)
+        return result
+
+    tracemalloc.start()
+    try:
+        run_pipeline(module, parse, text, timer)
+    finally:
+        tracemalloc.stop()
+    return overall[0], peaks
+
+def load_variants(names):
+    modules = {}
+    for name in names:
+        try:
+            modules[name] = importlib.import_module(name)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+    return modules
+
+def total_leads(processed):
+    # Shows when variants disagree, e.g. on comma-formatted counts
+    value = processed['metrics'].get('total_leads_dialled', 0)
+    return int(value) if value == value else 0  # NaN from pandas sums
+
+def format_row(result, baseline):
+    line = (f"{result['variant']:<18} {result['rows']:>9,} "
+            + ' '.join(f"{result[stage + '_ms']:>10.1f}" for stage in STAGES)
+            + f" {result['rows_per_second']:>12,.0f}")
+    line += f" {result['peak_mib']:>9.1f}" if result.get('peak_mib') is not None else f" {'-':>9}"
+    line += f" {result['body_bytes'] / 1048576:>8.1f} {result['total_leads']:>14,}"
+    previous = baseline.get((result['variant'], result['rows']))
+    if previous:
+        change = (result['rows_per_second'] / previous['rows_per_second'] - 1) * 100
+        line += f" {change:>+7.1f}%"
+    return line
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default=DEFAULT_ROWS, help=f'comma-separated sheet sizes, up to 1000000 (default {DEFAULT_ROWS})')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='comma-separated app modules to run')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per variant and size; the best is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare rows/s against')
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.variants.split(',') if name]
+    unknown = [name for name in names if name not in VARIANTS]
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(unknown)}")
+    modules = load_variants(names)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(result['variant'], result['rows']): result for result in json.load(f)['results']}
+
+    print(f"{'variant':<18} {'rows':>9} " + ' '.join(f"{stage + ' ms':>10}" for stage in STAGES)
+          + f" {'rows/s':>12} {'peak MiB':>9} {'body MiB':>8} {'total leads':>14}" + (' vs base' if baseline else ''))
+
+    results = []
+    for rows in sorted(int(size) for size in args.rows.split(',')):
+        text = generate_csv(rows, args.seed)
+        for name, module in modules.items():
+            parse = VARIANTS[name]
+            try:
+                timings, processed, body_bytes = time_variant(module, parse, text, args.repeat)
+                peak, peaks = (None, None) if args.no_memory else peak_memory(module, parse, text)
+            except Exception as e:
+                print(f"{name:<18} {rows:>9,} failed: {e}")
+                continue
+            result = {
+                'variant': name,
+                'rows': rows,
+                'rows_per_second': rows / sum(timings.values()),
+                'peak_mib': peak / 1048576 if peaks else None,
+                'body_bytes': body_bytes,
+                'total_leads': total_leads(processed)
+            }
+            for stage in STAGES:
+                result[stage + '_ms'] = timings[stage] * 1000
+                result[stage + '_peak_bytes'] = peaks[stage] if peaks else None
+            results.append(result)
+            print(format_row(result, baseline), flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'seed': args.seed, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Load test for the dashboard read endpoints
+
+Compares request throughput and latency percentiles between serving modes while
+an optional number of idle SSE subscribers hold connections open.
+
+Start the servers to compare, e.g. (-c /dev/null skips gunicorn.conf.py, which
+would switch the baseline to uvicorn workers):
+    gunicorn -c /dev/null --worker-class sync --bind 0.0.0.0:5000 --workers 4 comprehensive_app:app
+    uvicorn asgi_app:app --port 8000
+
+Then run:
+    python benchmarks/load_test.py --url http://localhost:5000 --url http://localhost:8000 \
+        --path /api/data --concurrency 64 --duration 15 --idle-streams 1000
+"""
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+async def open_connection(host, port):
+    return await asyncio.open_connection(host, port)
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response, returning (status, body length, keep-alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+        elif name == 'connection' and 'close' in value.lower():
+            # Sync gunicorn workers close after every response
+            keep_alive = False
+
+    if chunked:
+        total = 0
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            total += size
+            if size == 0:
+                return status, total, keep_alive
+    await reader.readexactly(length or 0)
+    return status, length or 0, keep_alive
+
+async def client_loop(host, port, path, deadline, timeout, latencies, errors):
+    request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n'.encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(open_connection(host, port), timeout)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            # A starved server shows up as timeouts rather than a hung run
+            status, _, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+    if writer is not None:
+        writer.close()
+
+async def idle_stream(host, port, timeout, ready, stop):
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(open_connection(host, port), timeout)
+        writer.write(f'GET /api/stream HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+        await writer.drain()
+        await asyncio.wait_for(reader.readline(), timeout)
+        ready.append(True)
+        await stop.wait()
+    except (OSError, ConnectionError, asyncio.TimeoutError):
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+async def run_target(url, path, concurrency, duration, idle_streams, timeout):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+
+    stop = asyncio.Event()
+    ready = []
+    streams = [asyncio.ensure_future(idle_stream(host, port, timeout, ready, stop)) for _ in range(idle_streams)]
+    if streams:
+        # Give the subscribers a moment to connect before measuring
+        await asyncio.sleep(min(5.0, 0.5 + idle_streams / 500))
+
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client_loop(host, port, path, deadline, timeout, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*streams, return_exceptions=True)
+
+    latencies.sort()
+    return {
+        'url': url,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'streams_open': len(ready),
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare dashboard serving modes under load')
+    parser.add_argument('--url', action='append', required=True, help='server base URL (repeat to compare)')
+    parser.add_argument('--path', default='/api/data')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--idle-streams', type=int, default=0, help='idle /api/stream subscribers held open during the run')
+    parser.add_argument('--timeout', type=float, default=5.0, help='per-request timeout in seconds')
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(run_target(url, args.path, args.concurrency, args.duration, args.idle_streams, args.timeout))
+        for url in args.url
+    ]
+
+    print(f"{'target':<30} {'requests':>9} {'errors':>7} {'streams':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(f"{result['url']:<30} {result['requests']:>9} {result['errors']:>7} {result['streams_open']:>8} "
+              f"{result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Synthetic campaign sheets shaped like the Google Sheets CSV export
+
+Rows carry the real column set, including the leading space in ' reporting CM',
+the 'connnected' typo, the four time-slot columns and comma-formatted counts,
+with the blanks and placeholders ('None', 'No Specific time', 'NA') the live
+sheet contains. Output is deterministic for a given row count and seed.
+
+    python benchmarks/sheet_generator.py 100000 > sheet.csv
+"""
+import csv
+import random
+import sys
+from io import StringIO
+
+COLUMNS = [
+    'S.no', 'Client', 'Bot Name', ' reporting CM', 'Campaign Status', 'Application Status (Voice)',
+    '1st Campaign', '2nd Campaign', '3rd Campaign', '4th Campaign',
+    'Total leads dialled', 'Total connnected calls', 'Monitoring', 'Reports'
+]
+TIME_COLUMNS = ['1st Campaign', '2nd Campaign', '3rd Campaign', '4th Campaign']
+
+CAMPAIGN_STATUSES = [('Live', 45), ('Posted', 25), ('No File', 15), ('Live - Paused', 5), ('Paused', 5), ('', 5)]
+APPLICATION_STATUSES = [('Approved', 60), ('Pending', 20), ('Rejected', 10), ('Under Review', 5), ('', 5)]
+BOT_KINDS = [('LLM Voice Bot', 40), ('Studio Bot', 25), ('SMS Bot', 15), ('IVR Bot', 15), ('WhatsApp Bot', 5)]
+CLIENT_WORDS = ['Finance', 'Insurance', 'Realty', 'Motors', 'Health', 'Telecom', 'Retail', 'Education', 'Logistics', 'Energy']
+MANAGERS = ['Upendra', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Sneha', 'Arjun', 'Kavya', 'Rohan', 'Meera',
+            'Aditya', 'Ishita', 'Karan', 'Pooja', 'Siddharth', 'Neha', 'Varun', 'Divya', 'Nikhil', 'Riya']
+
+def weighted(choices):
+    values = [value for value, _ in choices]
+    weights = [weight for _, weight in choices]
+    return lambda rng: rng.choices(values, weights)[0]
+
+pick_campaign_status = weighted(CAMPAIGN_STATUSES)
+pick_application_status = weighted(APPLICATION_STATUSES)
+pick_bot_kind = weighted(BOT_KINDS)
+
+def campaign_time(rng):
+    roll = rng.random()
+    if roll < 0.15:
+        return ''
+    if roll < 0.22:
+        return 'None'
+    if roll < 0.30:
+        return 'No Specific time'
+    hour = rng.choice([8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20])
+    return f"{(hour - 1) % 12 + 1}:{rng.choice(['00', '15', '30', '45'])} {'AM' if hour < 12 else 'PM'}"
+
+def count(rng, value):
+    """A count as the sheet shows it: comma-formatted, occasionally blank or 'NA'"""
+    roll = rng.random()
+    if roll < 0.04:
+        return ''
+    if roll < 0.06:
+        return 'NA'
+    return f'{value:,}'
+
+def generate_rows(rows, seed=0):
+    """Yield `rows` sheet rows as lists in COLUMNS order"""
+    rng = random.Random(seed)
+    # Most clients run a few campaigns; a handful run many
+    clients = max(rows // 3, 1)
+    for number in range(1, rows + 1):
+        client_id = min(int(rng.paretovariate(1.2)) - 1, clients - 1) if rng.random() < 0.3 else rng.randrange(clients)
+        client = f'{CLIENT_WORDS[client_id % len(CLIENT_WORDS)]} Client {client_id}'
+        # Bots are usually shared by a few campaigns of one client
+        bot = f'{pick_bot_kind(rng)} {client_id % 97}-{rng.randrange(3)}'
+        leads = int(rng.lognormvariate(7, 1.5))
+        calls = int(leads * rng.uniform(0.05, 0.6))
+        yield [
+            str(number),
+            client,
+            bot,
+            rng.choice(MANAGERS),
+            pick_campaign_status(rng),
+            pick_application_status(rng),
+            *[campaign_time(rng) for _ in TIME_COLUMNS],
+            count(rng, leads),
+            count(rng, calls),
+            f'MON-{rng.randrange(10 ** 6):06d}' if rng.random() < 0.9 else '',
+            f'https://reports.example.com/campaigns/{number}' if rng.random() < 0.7 else ''
+        ]
+
+def generate_csv(rows, seed=0):
+    """CSV text of a synthetic sheet, as the export URL would return it"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    writer.writerows(generate_rows(rows, seed))
+    return output.getvalue()
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sys.stdout.write(generate_csv(rows, seed))
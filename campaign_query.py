@@ -0,0 +1,266 @@
+"""
+Ad-hoc group-by queries over a columnar campaign snapshot
+Dimensions are dictionary-encoded once per snapshot so a query is a single pass over integer codes
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from itertools import product
+
+def bot_type(row):
+    """Classify a bot the same way the dashboard breakdown does"""
+    bot_name = (row.get('Bot Name') or '').strip()
+    if not bot_name:
+        return ''
+    if 'LLM' in bot_name:
+        return 'LLM'
+    if 'Studio' in bot_name:
+        return 'Studio'
+    if 'SMS' in bot_name:
+        return 'SMS'
+    return 'Other'
+
+def campaign_hours(row):
+    """Distinct 24h slots ("HH:00") from the campaign time columns"""
+    hours = []
+    for time_key in ('1st Campaign', '2nd Campaign', '3rd Campaign', '4th Campaign'):
+        time_val = (row.get(time_key) or '').strip()
+        if not time_val or time_val == 'None' or 'No Specific time' in time_val:
+            continue
+        if 'AM' not in time_val and 'PM' not in time_val:
+            continue
+        hour_match = re.search(r'(\d+):', time_val)
+        if not hour_match:
+            continue
+        hour = int(hour_match.group(1))
+        if 'PM' in time_val and hour != 12:
+            hour += 12
+        elif 'AM' in time_val and hour == 12:
+            hour = 0
+        label = f"{hour:02d}:00"
+        if label not in hours:
+            hours.append(label)
+    return hours
+
+def parse_count(value, default=0):
+    """Parse a comma-formatted sheet number; anything else (blank, 'NA', ...) gives `default`"""
+    value = (value or '').replace(',', '').strip()
+    return int(value) if value.isdigit() else default
+
+# name -> (row accessor, multi-valued)
+DIMENSIONS = {
+    'client': (lambda row: (row.get('Client') or '').strip(), False),
+    'cm': (lambda row: (row.get(' reporting CM') or '').strip(), False),
+    'bot': (lambda row: (row.get('Bot Name') or '').strip(), False),
+    'bot_type': (bot_type, False),
+    'status': (lambda row: (row.get('Campaign Status') or 'Unknown').strip(), False),
+    'app_status': (lambda row: (row.get('Application Status (Voice)') or 'Unknown').strip(), False),
+    'hour': (campaign_hours, True)
+}
+
+MEASURES = ['count', 'live', 'leads', 'calls', 'success_rate']
+
+class QueryError(ValueError):
+    """Raised for malformed queries"""
+
+def encode_dimension(values, multi):
+    """Dictionary-encode a column: distinct values plus one code (or code list) per row"""
+    index = {}
+    labels = []
+
+    def code_for(value):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(labels)
+            labels.append(value)
+        return code
+
+    if multi:
+        codes = [[code_for(value) for value in row_values] for row_values in values]
+    else:
+        codes = [code_for(value) for value in values]
+    return {'labels': labels, 'index': index, 'codes': codes, 'multi': multi}
+
+def build_query_columns(rows):
+    """Encode every dimension and parse every measure for a snapshot"""
+    dims = {}
+    for name, (accessor, multi) in DIMENSIONS.items():
+        dims[name] = encode_dimension([accessor(row) for row in rows], multi)
+
+    return {
+        'length': len(rows),
+        'dims': dims,
+        'leads': [parse_count(row.get('Total leads dialled')) for row in rows],
+        'calls': [parse_count(row.get('Total connnected calls')) for row in rows],
+        'live': [1 if 'Live' in (row.get('Campaign Status') or '') else 0 for row in rows]
+    }
+
+def name_list(value, what):
+    """A list of names from a comma-separated string or a list of strings"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [name.strip() for name in value.split(',') if name.strip()]
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise QueryError(f'{what} must be a comma-separated string or a list of strings')
+    return value
+
+def filter_values(name, allowed):
+    """The allowed values of one filter as strings; a single value may stand for a list"""
+    if not isinstance(allowed, list):
+        allowed = [allowed]
+    for value in allowed:
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise QueryError(f'Values of filter {name} must be strings or numbers')
+    return sorted(str(value) for value in allowed)
+
+def normalize_query(dimensions, measures=None, filters=None, limit=100):
+    """Validate a query and return it in canonical form (usable as a cache key)"""
+    dimensions = name_list(dimensions, 'dimensions')
+    measures = name_list(measures, 'measures') or ['count']
+    filters = filters or {}
+    if not isinstance(filters, dict):
+        raise QueryError('filters must be an object mapping dimensions to values')
+
+    for name in dimensions:
+        if name not in DIMENSIONS:
+            raise QueryError(f'Unknown dimension: {name}')
+    if len(set(dimensions)) != len(dimensions):
+        raise QueryError('Dimensions must not repeat')
+    for name in measures:
+        if name not in MEASURES:
+            raise QueryError(f'Unknown measure: {name}')
+
+    normalized_filters = {}
+    for name, allowed in filters.items():
+        if name not in DIMENSIONS:
+            raise QueryError(f'Unknown filter dimension: {name}')
+        normalized_filters[name] = filter_values(name, allowed)
+
+    if isinstance(limit, bool):
+        raise QueryError('limit must be an integer')
+    try:
+        limit = max(1, min(int(limit), 10000))
+    except (TypeError, ValueError):
+        raise QueryError('limit must be an integer')
+
+    return {'dimensions': dimensions, 'measures': measures, 'filters': normalized_filters, 'limit': limit}
+
+def query_key(query):
+    """Stable string key for a normalized query"""
+    return json.dumps(query, sort_keys=True, separators=(',', ':'))
+
+def run_group_by(columns, query):
+    """Evaluate a normalized query against encoded snapshot columns"""
+    dims = columns['dims']
+    selected = range(columns['length'])
+    allowed_codes = {}
+
+    for name, allowed in query['filters'].items():
+        column = dims[name]
+        codes_allowed = {column['index'][value] for value in allowed if value in column['index']}
+        allowed_codes[name] = codes_allowed
+        codes = column['codes']
+        if column['multi']:
+            selected = [i for i in selected if not codes_allowed.isdisjoint(codes[i])]
+        else:
+            selected = [i for i in selected if codes[i] in codes_allowed]
+
+    group_columns = [dims[name] for name in query['dimensions']]
+    group_allowed = [allowed_codes.get(name) for name in query['dimensions']]
+    leads, calls, live = columns['leads'], columns['calls'], columns['live']
+
+    # accumulators: [count, live, leads, calls]
+    groups = {}
+    has_multi = any(column['multi'] for column in group_columns)
+    for i in selected:
+        if has_multi:
+            parts = []
+            for column, codes_allowed in zip(group_columns, group_allowed):
+                code = column['codes'][i]
+                if column['multi']:
+                    parts.append([c for c in code if codes_allowed is None or c in codes_allowed])
+                else:
+                    parts.append((code,))
+            keys = product(*parts)
+        else:
+            keys = (tuple(column['codes'][i] for column in group_columns),)
+
+        for key in keys:
+            totals = groups.get(key)
+            if totals is None:
+                totals = groups[key] = [0, 0, 0, 0]
+            totals[0] += 1
+            totals[1] += live[i]
+            totals[2] += leads[i]
+            totals[3] += calls[i]
+
+    rows = []
+    for key, (count, live_count, lead_total, call_total) in groups.items():
+        values = {
+            'count': count,
+            'live': live_count,
+            'leads': lead_total,
+            'calls': call_total,
+            'success_rate': round(call_total / lead_total * 100, 2) if lead_total > 0 else 0
+        }
+        row = {name: column['labels'][code] for name, column, code in zip(query['dimensions'], group_columns, key)}
+        row.update({name: values[name] for name in query['measures']})
+        rows.append(row)
+
+    sort_measure = query['measures'][0]
+    rows.sort(key=lambda row: row[sort_measure], reverse=True)
+
+    return {
+        'dimensions': query['dimensions'],
+        'measures': query['measures'],
+        'total_groups': len(rows),
+        'rows': rows[:query['limit']]
+    }
+
+class QueryResultCache:
+    """LRU of query results keyed by (query, snapshot version) under a byte budget"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (result, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result, size=None):
+        if size is None:
+            size = len(json.dumps(result))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+            self.entries[key] = (result, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
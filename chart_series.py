@@ -0,0 +1,76 @@
+"""
+Chart.js-ready label/value arrays for the dashboard charts
+
+Snapshot charts are reshaped from the metrics dicts once per snapshot version.
+Time series are reduced to a target width with Largest-Triangle-Three-Buckets,
+which keeps the visual shape (peaks and dips) of a long series in a payload
+whose size depends only on the width of the chart.
+"""
+
+SNAPSHOT_CHARTS = ('status', 'app_status', 'bot_types', 'hourly', 'time_patterns', 'performance')
+TIME_PATTERN_LABELS = ['Morning', 'Afternoon', 'Evening', 'Night']
+PERFORMANCE_LABELS = ['Campaigns', 'Success Rate', 'Leads', 'Calls', 'Efficiency']
+MAX_WIDTH = 2000
+
+def labelled(mapping, labels=None):
+    labels = list(mapping) if labels is None else labels
+    return {'labels': labels, 'values': [mapping.get(label, 0) or 0 for label in labels]}
+
+def build_snapshot_charts(metrics):
+    """The six dashboard charts as {name: {'labels', 'values'}}, shaped like the page draws them"""
+    time_patterns = metrics.get('time_patterns') or {}
+    performance = metrics.get('performance_metrics') or {}
+    return {
+        'status': labelled(metrics.get('campaign_status_breakdown') or {}),
+        'app_status': labelled(metrics.get('application_status_breakdown') or {}),
+        'bot_types': labelled(metrics.get('bot_types_breakdown') or {}),
+        'hourly': labelled(metrics.get('hourly_distribution') or {}, sorted(metrics.get('hourly_distribution') or {})),
+        'time_patterns': {
+            'labels': TIME_PATTERN_LABELS,
+            'values': [time_patterns.get(label.lower(), 0) or 0 for label in TIME_PATTERN_LABELS]
+        },
+        'performance': {
+            'labels': PERFORMANCE_LABELS,
+            'values': [
+                min(performance.get('total_campaigns', 0) or 0, 100),
+                performance.get('campaign_utilization', 0) or 0,
+                min(performance.get('avg_leads_per_campaign', 0) or 0, 100),
+                min(performance.get('avg_calls_per_campaign', 0) or 0, 100),
+                performance.get('lead_conversion_rate', 0) or 0
+            ]
+        }
+    }
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets: at most `threshold` points that best preserve the line's shape"""
+    count = len(xs)
+    if threshold >= count or threshold < 3:
+        return list(xs), list(ys)
+
+    sampled_x, sampled_y = [xs[0]], [ys[0]]
+    bucket_size = (count - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        span = next_end - next_start
+        average_x = sum(xs[next_start:next_end]) / span
+        average_y = sum(ys[next_start:next_end]) / span
+
+        # Pick the point in this bucket forming the largest triangle with the last pick
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        point_x, point_y = xs[selected], ys[selected]
+        largest, chosen = -1.0, start
+        for index in range(start, end):
+            area = abs((point_x - average_x) * (ys[index] - point_y) - (point_x - xs[index]) * (average_y - point_y))
+            if area > largest:
+                largest, chosen = area, index
+        sampled_x.append(xs[chosen])
+        sampled_y.append(ys[chosen])
+        selected = chosen
+
+    sampled_x.append(xs[-1])
+    sampled_y.append(ys[-1])
+    return sampled_x, sampled_y
@@ -1,21 +1,161 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, g
 import requests
 import json
+import hashlib
 import csv
 from datetime import datetime, timedelta
 import threading
 import time
 import re
+import os
+import atexit
 from io import StringIO
+from collections import OrderedDict
+from contextlib import contextmanager
 import calendar
 
+from chart_series import MAX_WIDTH as CHART_MAX_WIDTH, SNAPSHOT_CHARTS, build_snapshot_charts, lttb
+from leader_lease import LeaderLease
+from metric_history import AGGREGATES, HISTORY_FIELDS, MetricHistory
+from prometheus_metrics import MetricsRegistry
+from request_metrics import RequestMetrics, TimedLock, record_stage, set_route
+from rolling_windows import GROUPS as ROLLING_GROUPS, RollingAggregates
+from search_index import CampaignSearchIndex
+from snapshot_archive import SnapshotArchive
+from shared_snapshot import SharedSnapshotStore, sheet_slug
+from snapshot_directory import SnapshotDirectory
+from tenant_cache import SheetTenantCache
+from timeseries_store import MEASURES as SERIES_MEASURES, SERIES_GROUPS, TIERS, TimeSeriesStore, snapshot_series
+from campaign_query import DIMENSIONS, QueryError, QueryResultCache, build_query_columns, normalize_query, parse_count, query_key, run_group_by
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet/Arrow exports are optional
+    pa = None
+    pq = None
+
 app = Flask(__name__)
 
-# Global variables for caching
-cached_data = None
-last_update = None
-current_sheet_url = None
-update_lock = threading.Lock()
+DEFAULT_SHEET_URL = "https://docs.google.com/spreadsheets/d/1suvLm83Xlsx4k4h1KJqugFt0sh6dQn3Z47ugXr8lN5c/edit"
+DEFAULT_GID = '475146199'  # Default to your specific sheet tab
+
+# Global variables for caching; time requests spend waiting for the lock shows up in /metrics
+update_lock = TimedLock('update_lock')
+
+# Snapshot versions are issued from one counter, seeded from the shared store when this
+# process starts refreshing; snapshots adopted from ingest bring their own, so a version
+# is only meaningful together with its sheet
+snapshot_version = 0
+snapshot_condition = threading.Condition()
+STREAM_HEARTBEAT_SECONDS = 15
+snapshot_listeners = []  # callables notified with (sheet key, new version) after each publish
+
+NUMERIC_COLUMNS = ['Total leads dialled', 'Total connnected calls']
+EXPORT_CHUNK_ROWS = 500
+
+# Search indexes are patched in place for small deltas
+search_lock = threading.Lock()
+SEARCH_REBUILD_RATIO = 0.25
+
+# Ad-hoc group-by results, memoized per (query, snapshot version)
+query_cache = QueryResultCache(max_bytes=int(os.environ.get('QUERY_CACHE_BYTES', 16 * 1024 * 1024)))
+
+# /api/batch widget results, memoized per (snapshot version, widget) under their own budget
+widget_cache = QueryResultCache(max_bytes=int(os.environ.get('WIDGET_CACHE_BYTES', 16 * 1024 * 1024)))
+
+# Only sheets viewed within this window (or with stream subscribers) are refreshed
+VIEWER_TTL_SECONDS = int(os.environ.get('VIEWER_TTL_SECONDS', 300))
+
+# With several worker processes, one refresher publishes snapshots into memory-mapped
+# files here and every worker adopts them instead of fetching the sheet itself
+SHARED_SNAPSHOT_DIR = os.environ.get('SHARED_SNAPSHOT_DIR')
+SHARED_SNAPSHOT_POLL_SECONDS = float(os.environ.get('SHARED_SNAPSHOT_POLL_SECONDS', 1))
+shared_store = SharedSnapshotStore(SHARED_SNAPSHOT_DIR) if SHARED_SNAPSHOT_DIR else None
+
+# Every process runs the refresh loop, but only the holder of this lease fetches sheets
+REFRESH_INTERVAL_SECONDS = 60
+LEADER_LEASE_TTL_SECONDS = int(os.environ.get('LEADER_LEASE_TTL_SECONDS', 30))
+leader_lease = LeaderLease(
+    os.environ.get('LEADER_LEASE_PATH') or os.path.join(SHARED_SNAPSHOT_DIR, 'refresh.lease'),
+    ttl=LEADER_LEASE_TTL_SECONDS
+) if shared_store is not None else None
+
+# Deployment role: 'standalone' fetches and serves; 'ingest' also publishes every snapshot as a
+# versioned object under SNAPSHOT_PUBLISH_DIR; 'api' never contacts Google Sheets and serves
+# whatever the ingest node published there
+APP_ROLE = os.environ.get('APP_ROLE', 'standalone')
+SNAPSHOT_PUBLISH_DIR = os.environ.get('SNAPSHOT_PUBLISH_DIR')
+SNAPSHOT_POLL_SECONDS = float(os.environ.get('SNAPSHOT_POLL_SECONDS', 5))
+snapshot_directory = SnapshotDirectory(SNAPSHOT_PUBLISH_DIR) if SNAPSHOT_PUBLISH_DIR and APP_ROLE != 'standalone' else None
+if APP_ROLE in ('ingest', 'api') and snapshot_directory is None:
+    raise RuntimeError(f'APP_ROLE={APP_ROLE} requires SNAPSHOT_PUBLISH_DIR')
+
+# Stale-while-revalidate: reads never wait on Google Sheets. Snapshots older than
+# STALE_AFTER_SECONDS are served as-is while a background refresh runs; past
+# MAX_STALENESS_SECONDS the policy decides: 'serve' (flagged as stale) or 'reject' (503)
+STALE_AFTER_SECONDS = int(os.environ.get('STALE_AFTER_SECONDS', 90))
+MAX_STALENESS_SECONDS = int(os.environ.get('MAX_STALENESS_SECONDS', 900))
+MAX_STALENESS_POLICY = os.environ.get('MAX_STALENESS_POLICY', 'serve')
+REVALIDATE_RETRY_SECONDS = 10
+revalidate_lock = threading.Lock()
+
+# Metric history: one point per fetched snapshot, persisted so it survives restarts.
+# Ingest/API deployments keep it next to the published snapshots so every node can read it
+HISTORY_DIR = os.environ.get('HISTORY_DIR') or (
+    os.path.join(SNAPSHOT_PUBLISH_DIR, 'history') if snapshot_directory is not None
+    else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history')
+)
+HISTORY_CAPACITY = int(os.environ.get('HISTORY_CAPACITY', 7 * 24 * 60))
+HISTORY_MAX_POINTS = 5000
+history_lock = threading.Lock()
+
+# Time travel: every fetched snapshot is archived (rows deduplicated by content) for this long
+ARCHIVE_RETENTION_DAYS = float(os.environ.get('ARCHIVE_RETENTION_DAYS', 30))
+archived_snapshots = OrderedDict()  # tree hash -> rebuilt snapshot, most recently used last
+archived_snapshots_lock = threading.Lock()
+ARCHIVED_SNAPSHOT_CACHE = 4
+
+# Render the current KPIs into the dashboard page itself, so the first byte already has numbers
+INLINE_INITIAL_PAYLOAD = os.environ.get('INLINE_INITIAL_PAYLOAD', '1') != '0'
+
+# Refresh pipeline instrumentation, scraped from /metrics
+metrics_registry = MetricsRegistry()
+refresh_stage_seconds = metrics_registry.histogram(
+    'dashboard_refresh_stage_seconds', 'Time spent in each stage of a sheet refresh', ['stage'])
+refresh_last_stage_seconds = metrics_registry.gauge(
+    'dashboard_refresh_last_stage_seconds', 'Duration of each stage in the latest refresh of a sheet', ['sheet', 'stage'])
+refreshes_total = metrics_registry.counter(
+    'dashboard_refreshes_total', 'Sheet refreshes by result (success, empty, error)', ['sheet', 'result'])
+refresh_failures_total = metrics_registry.counter(
+    'dashboard_refresh_failures_total', 'Failed refreshes by the stage that failed', ['sheet', 'stage'])
+refresh_downloaded_bytes_total = metrics_registry.counter(
+    'dashboard_refresh_downloaded_bytes_total', 'CSV bytes downloaded from Google Sheets', ['sheet'])
+refresh_rows_total = metrics_registry.counter(
+    'dashboard_refresh_rows_total', 'Sheet rows parsed', ['sheet'])
+refresh_last_success = metrics_registry.gauge(
+    'dashboard_refresh_last_success_timestamp_seconds', 'When the latest successful refresh of a sheet finished', ['sheet'])
+refresh_last_failure = metrics_registry.gauge(
+    'dashboard_refresh_last_failure_timestamp_seconds', 'When the latest failed refresh of a sheet finished', ['sheet'])
+snapshot_age_seconds = metrics_registry.gauge(
+    'dashboard_snapshot_age_seconds', 'Seconds since the served snapshot of a sheet was fetched', ['sheet'])
+snapshot_version_info = metrics_registry.gauge(
+    'dashboard_snapshot_version', 'Version of the served snapshot of a sheet', ['sheet'])
+snapshot_bytes = metrics_registry.gauge(
+    'dashboard_snapshot_bytes', 'Serialized size of the served snapshot of a sheet', ['sheet'])
+
+# Per-route request latency, lock wait, size and status, plus a sampled log of slow requests
+# (SLOW_REQUEST_LOG is a JSON-lines file; without it they are printed)
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+SLOW_REQUEST_SAMPLE = float(os.environ.get('SLOW_REQUEST_SAMPLE', 0.1))
+request_metrics = RequestMetrics(
+    app.wsgi_app, metrics_registry,
+    slow_seconds=SLOW_REQUEST_SECONDS,
+    slow_sample=SLOW_REQUEST_SAMPLE,
+    slow_log=os.environ.get('SLOW_REQUEST_LOG')
+)
+app.wsgi_app = request_metrics
 
 def extract_sheet_id_from_url(url):
     """Extract sheet ID from Google Sheets URL"""
@@ -31,6 +171,19 @@ def extract_sheet_id_from_url(url):
     except:
         return None
 
+def extract_gid_from_url(url):
+    """Extract the sheet tab gid from a Google Sheets URL"""
+    if 'gid=' in url:
+        return url.split('gid=')[1].split('#')[0].split('&')[0]
+    return DEFAULT_GID
+
+def get_sheet_key(sheet_url):
+    """Cache key for a sheet tab: '<sheet id>:<gid>'"""
+    sheet_id = extract_sheet_id_from_url(sheet_url)
+    if not sheet_id:
+        return None
+    return f"{sheet_id}:{extract_gid_from_url(sheet_url)}"
+
 def get_csv_url_from_sheet_url(sheet_url):
     """Convert Google Sheets URL to CSV export URL"""
     sheet_id = extract_sheet_id_from_url(sheet_url)
@@ -38,54 +191,104 @@ def get_csv_url_from_sheet_url(sheet_url):
         return None
     
     # Get the gid (sheet tab) from URL
-    gid = '475146199'  # Default to your specific sheet tab
-    if 'gid=' in sheet_url:
-        gid = sheet_url.split('gid=')[1].split('#')[0].split('&')[0]
+    gid = extract_gid_from_url(sheet_url)
     
     # Create CSV export URL
     csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid={gid}"
     return csv_url
 
+def resolve_tenant(sheet=None):
+    """Find or register the tenant for a sheet URL or key (default sheet when empty)"""
+    sheet = (sheet or '').strip() or DEFAULT_SHEET_URL
+    
+    if '/' in sheet:
+        sheet_url = sheet
+        key = get_sheet_key(sheet_url)
+    else:
+        # Keys carry the sheet id and gid, so an evicted tenant can always be rebuilt
+        key = sheet
+        sheet_id, _, gid = key.partition(':')
+        sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit#gid={gid}" if sheet_id and gid else None
+    
+    if not key or not sheet_url:
+        return None
+    return tenant_cache.get_or_create(key, sheet_url)
+
+@contextmanager
+def refresh_stage(tenant, stage):
+    """Time one stage of a sheet refresh; an exception counts as a failure of that stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        refresh_failures_total.inc(sheet=tenant.key, stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        refresh_stage_seconds.observe(elapsed, stage=stage)
+        refresh_last_stage_seconds.set(elapsed, sheet=tenant.key, stage=stage)
+        # A refresh run by a request (/api/refresh, /api/config) shows up in its slow-request entry
+        record_stage(f'refresh:{stage}', elapsed)
+
+def record_refresh_result(tenant, result):
+    refreshes_total.inc(sheet=tenant.key, result=result)
+    last = refresh_last_success if result == 'success' else refresh_last_failure
+    last.set(time.time(), sheet=tenant.key)
+
 def fetch_sheet_data(sheet_url=None):
     """Fetch data from Google Sheets via CSV export"""
-    global cached_data, last_update, current_sheet_url
-    
+    tenant = None
     try:
         if not sheet_url:
-            sheet_url = "https://docs.google.com/spreadsheets/d/1suvLm83Xlsx4k4h1KJqugFt0sh6dQn3Z47ugXr8lN5c/edit"
+            sheet_url = DEFAULT_SHEET_URL
         
-        current_sheet_url = sheet_url
+        tenant = resolve_tenant(sheet_url)
         csv_url = get_csv_url_from_sheet_url(sheet_url)
         
-        if not csv_url:
+        if not tenant or not csv_url:
             return None
         
+        if APP_ROLE == 'api':
+            # Adding API nodes must never add load on Google Sheets
+            return load_published_snapshot(tenant)
+        
         # Fetch CSV data
-        response = requests.get(csv_url, timeout=30)
-        response.raise_for_status()
+        with refresh_stage(tenant, 'download'):
+            response = requests.get(csv_url, timeout=30)
+            response.raise_for_status()
+            text = response.text
+        refresh_downloaded_bytes_total.inc(len(response.content), sheet=tenant.key)
         
         # Parse CSV
-        csv_data = StringIO(response.text)
-        reader = csv.DictReader(csv_data)
-        data = list(reader)
+        with refresh_stage(tenant, 'parse'):
+            data = list(csv.DictReader(StringIO(text)))
+        refresh_rows_total.inc(len(data), sheet=tenant.key)
         
         if not data:
+            record_refresh_result(tenant, 'empty')
             return None
         
         # Process data
-        processed_data = process_campaign_data(data)
+        with refresh_stage(tenant, 'aggregate'):
+            processed_data = process_campaign_data(data, sheet_url)
         
-        with update_lock:
-            cached_data = processed_data
-            last_update = datetime.now()
+        if processed_data:
+            publish_snapshot(tenant, processed_data)
+            record_refresh_result(tenant, 'success')
+        else:
+            # process_campaign_data prints and swallows its own errors
+            refresh_failures_total.inc(sheet=tenant.key, stage='aggregate')
+            record_refresh_result(tenant, 'error')
         
         return processed_data
         
     except Exception as e:
         print(f"Error fetching sheet data: {e}")
+        if tenant:
+            record_refresh_result(tenant, 'error')
         return None
 
-def process_campaign_data(data):
+def process_campaign_data(data, sheet_url=None):
     """Process and clean the campaign data with comprehensive analytics"""
     try:
         # Initialize counters and analytics
@@ -316,7 +519,7 @@ def process_campaign_data(data):
             'cm_performance': cm_performance,
             'bot_performance': bot_performance,
             'last_updated': datetime.now().isoformat(),
-            'sheet_url': current_sheet_url
+            'sheet_url': sheet_url
         }
         
         return {
@@ -339,36 +542,1415 @@ def process_campaign_data(data):
         print(f"Error processing data: {e}")
         return None
 
-def auto_refresh():
-    """Auto-refresh data every minute"""
-    while True:
+def snapshot_row_keys(rows):
+    """Build a stable key for every row (S.no, then Monitoring ID, then position)"""
+    keys = []
+    seen = {}
+    for index, row in enumerate(rows):
+        key = (row.get('S.no') or '').strip() or (row.get('Monitoring') or '').strip() or f'#{index}'
+        if key in seen:
+            seen[key] += 1
+            key = f'{key}~{seen[key]}'
+        else:
+            seen[key] = 0
+        keys.append(key)
+    return keys
+
+def compute_snapshot_delta(previous, current):
+    """Diff two processed snapshots into changed metrics, analytics and rows"""
+    delta = {'metrics': {}, 'analytics': {}, 'rows': {'upserts': {}, 'removed': []}}
+    
+    for section in ('metrics', 'analytics'):
+        old_values = previous.get(section) or {}
+        for name, value in (current.get(section) or {}).items():
+            if old_values.get(name) != value:
+                delta[section][name] = value
+    
+    old_rows = dict(zip(previous['row_keys'], previous['raw_data']))
+    for key, row in zip(current['row_keys'], current['raw_data']):
+        if old_rows.get(key) != row:
+            delta['rows']['upserts'][key] = row
+    
+    current_keys = set(current['row_keys'])
+    delta['rows']['removed'] = [key for key in previous['row_keys'] if key not in current_keys]
+    
+    # Only ship the key order when rows were added, removed or moved
+    if previous['row_keys'] != current['row_keys']:
+        delta['order'] = current['row_keys']
+    
+    return delta
+
+def publish_snapshot(tenant, processed_data):
+    """Swap in a freshly fetched snapshot for a sheet and share it with the other workers"""
+    with refresh_stage(tenant, 'install'):
+        processed_data['row_keys'] = snapshot_row_keys(processed_data['raw_data'])
+        installed = install_snapshot(tenant, processed_data, datetime.now())
+    if installed:
+        with refresh_stage(tenant, 'share'):
+            share_snapshot(tenant, *installed)
+        with refresh_stage(tenant, 'archive'):
+            archive_snapshot(tenant, processed_data, installed[0])
+        with refresh_stage(tenant, 'history'):
+            record_history(tenant, processed_data)
+        with refresh_stage(tenant, 'rolling'):
+            record_rolling_windows(tenant, processed_data)
+        with refresh_stage(tenant, 'timeseries'):
+            record_timeseries(tenant, processed_data)
+
+def tenant_history(tenant):
+    """A sheet's metric history, loaded from disk on first use"""
+    if tenant.history is None:
+        with history_lock:
+            if tenant.history is None:
+                tenant.history = MetricHistory(os.path.join(HISTORY_DIR, sheet_slug(tenant.key)), capacity=HISTORY_CAPACITY).load()
+    return tenant.history
+
+def tenant_rolling(tenant):
+    """A sheet's rolling-window aggregates, kept with its history"""
+    if tenant.rolling is None:
+        with history_lock:
+            if tenant.rolling is None:
+                tenant.rolling = RollingAggregates(os.path.join(HISTORY_DIR, sheet_slug(tenant.key), 'rolling.json'))
+    # Picks up state written by the previous leader or a previous run
+    return tenant.rolling.reload()
+
+def record_rolling_windows(tenant, processed_data):
+    """Feed the counter increments since the previous fetch into the rolling windows"""
+    try:
+        tenant_rolling(tenant).update(processed_data['metrics'])
+    except (OSError, ValueError) as e:
+        print(f"Error updating rolling windows: {e}")
+
+def tenant_timeseries(tenant):
+    """The sheet's compressed long-term per-client/CM/bot series, kept with its history
+    
+    One store per sheet, so its lock serializes the appends (and head seals) of the
+    refresh, manual refresh and revalidation threads.
+    """
+    if tenant.timeseries is None:
+        with history_lock:
+            if tenant.timeseries is None:
+                tenant.timeseries = TimeSeriesStore(os.path.join(HISTORY_DIR, sheet_slug(tenant.key), 'tsdb'))
+    return tenant.timeseries
+
+def record_timeseries(tenant, processed_data):
+    """Append every client, CM and bot counter of a fetched snapshot to long-term storage"""
+    try:
+        tenant_timeseries(tenant).append(processed_data['metrics'])
+    except (OSError, ValueError) as e:
+        print(f"Error recording long-term series: {e}")
+
+def tenant_archive(tenant):
+    """The sheet's snapshot archive, kept with its history"""
+    if tenant.archive is None:
+        with history_lock:
+            if tenant.archive is None:
+                tenant.archive = SnapshotArchive(
+                    os.path.join(HISTORY_DIR, sheet_slug(tenant.key), 'archive'),
+                    retention_seconds=ARCHIVE_RETENTION_DAYS * 86400
+                ).refresh()
+    return tenant.archive
+
+def archive_snapshot(tenant, processed_data, version):
+    """Keep a fetched snapshot for time-travel reads"""
+    try:
+        tenant_archive(tenant).add(processed_data, version, tenant.last_update)
+    except (OSError, ValueError) as e:
+        print(f"Error archiving snapshot: {e}")
+
+def snapshot_as_of(tenant, at):
+    """(archive entry, snapshot) shown at time `at`, or (None, None) if nothing was retained then"""
+    archive = tenant_archive(tenant)
+    entry = archive.entry_at(at)
+    if entry is None:
+        return None, None
+    
+    with archived_snapshots_lock:
+        snapshot = archived_snapshots.get(entry['tree'])
+        if snapshot is not None:
+            archived_snapshots.move_to_end(entry['tree'])
+    if snapshot is None:
+        # Loaded outside the lock; two requests for the same tree may both load it
+        snapshot = archive.load(entry)
+        with archived_snapshots_lock:
+            archived_snapshots[entry['tree']] = snapshot
+            archived_snapshots.move_to_end(entry['tree'])
+            while len(archived_snapshots) > ARCHIVED_SNAPSHOT_CACHE:
+                archived_snapshots.popitem(last=False)
+    
+    # Trees are shared by identical snapshots; the fetch time belongs to the timeline entry
+    if snapshot['metrics'].get('last_updated') != entry['last_updated']:
+        snapshot = dict(snapshot, metrics=dict(snapshot['metrics'], last_updated=entry['last_updated']))
+    return entry, snapshot
+
+def record_history(tenant, processed_data):
+    """Append a fetched snapshot's headline metrics to the sheet's history"""
+    try:
+        tenant_history(tenant).append(processed_data['metrics'])
+    except OSError as e:
+        print(f"Error recording metric history: {e}")
+
+def share_snapshot(tenant, version, body):
+    """Hand a snapshot to the other workers on this host and, on the ingest node, to the API nodes"""
+    try:
+        if shared_store is not None:
+            shared_store.publish(tenant.key, version, body)
+        if APP_ROLE == 'ingest':
+            snapshot_directory.publish(tenant.key, version, body)
+    except OSError as e:
+        print(f"Error publishing shared snapshot: {e}")
+
+def install_serialized_snapshot(tenant, version, body):
+    """Install a snapshot from its /api/data body, which is then served as-is"""
+    payload = json.loads(body)
+    last_update = datetime.fromisoformat(payload['last_update']) if payload.get('last_update') else None
+    return install_snapshot(tenant, payload['data'], last_update, version=version, body=body)
+
+def load_published_snapshot(tenant):
+    """Install the newest snapshot the ingest node published for a sheet (API role)"""
+    snapshot_directory.register_interest(tenant.key)
+    manifest = snapshot_directory.manifest(tenant.key)
+    if manifest and manifest['version'] > tenant.version:
+        # Objects are immutable and the manifest is swapped atomically, so this is a complete snapshot
+        body = snapshot_directory.load(tenant.key, manifest)
+        if body is not None and install_serialized_snapshot(tenant, manifest['version'], body):
+            share_snapshot(tenant, manifest['version'], body)
+    return tenant.data
+
+def newer_shared_snapshot(tenant):
+    """Stamp a sheet as viewed in its shared file; return that snapshot if it is newer than ours
+    
+    Only reads the mapped header, so it is cheap enough for the event loop.
+    """
+    if shared_store is None:
+        return None
+    shared = shared_store.current(tenant.key)
+    if shared is None:
+        return None
+    shared.touch()
+    return shared if shared.version > tenant.version else None
+
+def adopt_shared_snapshot(tenant, shared=None):
+    """Pick up a newer snapshot another process published for this sheet"""
+    shared = shared or newer_shared_snapshot(tenant)
+    if shared is None:
+        return
+    
+    # Only parsed for search, queries and deltas; /api/data serves the bytes unchanged
+    install_serialized_snapshot(tenant, shared.version, bytes(shared.payload()))
+
+def install_snapshot(tenant, processed_data, last_update, version=None, body=None):
+    """Make a snapshot current for a sheet and notify stream subscribers with its delta
+    
+    New versions come from the global counter unless an adopted snapshot brings its own;
+    returns (version, /api/data body), or None when a newer snapshot is already installed.
+    """
+    global snapshot_version
+    
+    with snapshot_condition:
+        with update_lock:
+            if version is None:
+                # Stay ahead of versions other processes already published for this sheet
+                if shared_store is not None:
+                    snapshot_version = max(snapshot_version, shared_store.current_version(tenant.key))
+                if APP_ROLE == 'ingest':
+                    snapshot_version = max(snapshot_version, snapshot_directory.latest_version(tenant.key))
+                snapshot_version += 1
+                version = snapshot_version
+            elif version <= tenant.version:
+                return None
+            else:
+                snapshot_version = max(snapshot_version, version)
+            previous, previous_version = tenant.data, tenant.version
+            # Serialize the /api/data body up front (adopted snapshots bring theirs);
+            # its size is the tenant's share of the cache budget
+            tenant.artifacts = (version, {'data_json': body} if body is not None else {})
+            tenant.data = processed_data
+            tenant.last_update = last_update
+            tenant.version = version
+        
+        # A first snapshot cannot be patched; subscribers refetch instead
+        delta = None
+        payload = None
+        if previous:
+            delta = compute_snapshot_delta(previous, processed_data)
+            delta['version'] = version
+            delta['base'] = previous_version
+            delta['last_update'] = last_update.isoformat() if last_update else None
+            payload = json.dumps(delta)
+        
+        update_search_index(tenant, processed_data, version, previous_version, delta)
+        tenant.deltas.append((version, previous_version, payload))
+        
+        body = get_snapshot_artifact(tenant, 'data_json', processed_data, version, lambda data: build_data_payload(data, version, last_update))
+        snapshot_condition.notify_all()
+    
+    tenant_cache.record_size(tenant, len(body))
+    
+    for listener in snapshot_listeners:
         try:
-            fetch_sheet_data(current_sheet_url)
-            print(f"Data refreshed at {datetime.now()}")
+            listener(tenant.key, version)
         except Exception as e:
-            print(f"Error in auto-refresh: {e}")
-        time.sleep(60)  # Wait 60 seconds
+            print(f"Error notifying snapshot listener: {e}")
+    
+    return version, body
+
+def update_search_index(tenant, snapshot, version, previous_version, delta=None):
+    """Keep a sheet's search index in step with its published snapshot"""
+    rows = delta['rows'] if delta else None
+    with search_lock:
+        if (tenant.search_index is not None and rows is not None and tenant.search_index_version == previous_version
+                and len(rows['upserts']) + len(rows['removed']) <= len(snapshot['raw_data']) * SEARCH_REBUILD_RATIO):
+            tenant.search_index.apply_changes(rows['upserts'], rows['removed'])
+            tenant.search_index_version = version
+            return
+    
+    # Large or unrelated changes: build a fresh index without blocking searches
+    index = CampaignSearchIndex().build(snapshot['row_keys'], snapshot['raw_data'])
+    with search_lock:
+        tenant.search_index = index
+        tenant.search_index_version = version
+
+def on_tenant_evicted(tenant):
+    """Release what an evicted sheet still holds, even while requests still reference it"""
+    tenant.artifacts = (0, {})
+    metrics_registry.remove(sheet=tenant.key)
+
+# Any ?sheet= key creates a tenant, so their number is capped and ones that never
+# fetched are dropped after EMPTY_TENANT_TTL_SECONDS
+tenant_cache = SheetTenantCache(
+    max_bytes=int(os.environ.get('TENANT_CACHE_BYTES', 256 * 1024 * 1024)),
+    on_evict=on_tenant_evicted,
+    max_tenants=int(os.environ.get('MAX_TENANTS', 100)),
+    empty_ttl=int(os.environ.get('EMPTY_TENANT_TTL_SECONDS', 300))
+)
+
+def get_snapshot(tenant):
+    """Return a sheet's current snapshot and its version as a consistent pair"""
+    with update_lock:
+        return tenant.data, tenant.version
+
+def get_snapshot_artifact(tenant, name, snapshot, version, builder):
+    """Build an artifact from a sheet's snapshot once per version and reuse it afterwards
+    
+    Artifacts of a version that is no longer installed are built but not kept.
+    """
+    artifacts_version, artifacts = tenant.artifacts
+    if artifacts_version != version:
+        artifacts = None
+    artifact = artifacts.get(name) if artifacts is not None else None
+    if artifact is None:
+        start = time.perf_counter()
+        artifact = builder(snapshot)
+        if artifacts is not None:
+            artifacts[name] = artifact
+        record_stage(f"build:{name.split(':', 1)[0]}", time.perf_counter() - start)
+    return artifact
+
+def peek_snapshot_artifact(tenant, name, version):
+    """Return an already built artifact, or None"""
+    artifacts_version, artifacts = tenant.artifacts
+    return artifacts.get(name) if artifacts_version == version else None
+
+def snapshot_etag(tenant, version, kind):
+    """ETag of a response built from one sheet's snapshot version
+    
+    Versions alone are not unique across sheets, so the sheet is part of the tag.
+    """
+    return f'"{sheet_slug(tenant.key)}-v{version}-{kind}"'
+
+def build_data_payload(snapshot, version, updated):
+    """Serialize the /api/data response body once per snapshot version"""
+    return json.dumps({
+        'data': snapshot,
+        'last_update': updated.isoformat() if updated else None,
+        'version': version,
+        'status': 'success'
+    }).encode('utf-8')
+
+def build_snapshot_columns(snapshot):
+    """Transpose the snapshot rows into column lists, with counts parsed once"""
+    rows = snapshot['raw_data']
+    names = list(rows[0].keys()) if rows else []
+    columns = {name: [row.get(name) or '' for row in rows] for name in names}
+    # Typed exports keep blanks as nulls
+    numeric = {name: [parse_count(value, None) for value in columns[name]] for name in NUMERIC_COLUMNS if name in columns}
+    return {'names': names, 'columns': columns, 'numeric': numeric, 'length': len(rows)}
+
+def build_arrow_table(tenant, snapshot, version):
+    """Build an Arrow table straight from the columnar view"""
+    view = get_snapshot_artifact(tenant, 'columns', snapshot, version, build_snapshot_columns)
+    arrays = []
+    for name in view['names']:
+        if name in view['numeric']:
+            arrays.append(pa.array(view['numeric'][name], type=pa.int64()))
+        else:
+            arrays.append(pa.array(view['columns'][name], type=pa.string()))
+    return pa.Table.from_arrays(arrays, names=view['names'])
+
+def build_parquet_export(tenant, snapshot, version):
+    """Serialize the snapshot as Parquet bytes"""
+    sink = pa.BufferOutputStream()
+    pq.write_table(build_arrow_table(tenant, snapshot, version), sink, compression='snappy')
+    return sink.getvalue().to_pybytes()
+
+def build_arrow_export(tenant, snapshot, version):
+    """Serialize the snapshot as an Arrow IPC file"""
+    table = build_arrow_table(tenant, snapshot, version)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def generate_csv_export(rows):
+    """Yield the snapshot rows as CSV in small chunks"""
+    output = StringIO()
+    writer = csv.DictWriter(output, fieldnames=rows[0].keys())
+    writer.writeheader()
+    
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        writer.writerows(rows[start:start + EXPORT_CHUNK_ROWS])
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+    
+    remainder = output.getvalue()
+    if remainder:
+        yield remainder
+
+def run_snapshot_query(tenant, snapshot, version, query):
+    """Run a normalized group-by query, serving repeats from the result cache"""
+    key = (tenant.key, version, query_key(query))
+    result = query_cache.get(key)
+    if result is not None:
+        return result, True
+    
+    columns = get_snapshot_artifact(tenant, 'query_columns', snapshot, version, lambda data: build_query_columns(data['raw_data']))
+    result = run_group_by(columns, query)
+    query_cache.put(key, result)
+    return result, False
+
+def search_response(tenant, query, limit=20, fuzzy=True):
+    """Build the /api/search response body"""
+    if not query:
+        return {'status': 'error', 'message': 'Missing search query'}
+    
+    started = time.perf_counter()
+    with search_lock:
+        if tenant.search_index is None:
+            return {'status': 'error', 'message': 'No data available to search'}
+        matches = tenant.search_index.search(query, limit=min(max(limit, 1), 200), fuzzy=fuzzy)
+        version = tenant.search_index_version
+    took_ms = (time.perf_counter() - started) * 1000
+    
+    return {
+        'status': 'success',
+        'query': query,
+        'version': version,
+        'took_ms': round(took_ms, 3),
+        'freshness': snapshot_freshness(tenant),
+        'results': [{'key': key, 'score': score, 'row': row} for key, row, score in matches]
+    }
+
+def query_params_from_args(args):
+    """Read a query from GET arguments: ?dimensions=cm,bot_type&measures=count,leads&filter.status=Live,Posted"""
+    return {
+        'dimensions': args.get('dimensions', ''),
+        'measures': args.get('measures', 'count'),
+        'limit': args.get('limit', 100),
+        'filters': {
+            name[len('filter.'):]: value.split(',')
+            for name, value in args.items() if name.startswith('filter.')
+        }
+    }
+
+def query_response(tenant, params):
+    """Build the /api/query response body and its status (400 for a malformed query)"""
+    try:
+        if not isinstance(params, dict):
+            raise QueryError('The query must be a JSON object')
+        query = normalize_query(
+            params.get('dimensions'),
+            params.get('measures'),
+            params.get('filters'),
+            params.get('limit', 100)
+        )
+    except QueryError as e:
+        return {'status': 'error', 'message': str(e)}, 400
+    
+    snapshot, version = get_snapshot(tenant)
+    if not snapshot or not snapshot.get('raw_data'):
+        return {'status': 'error', 'message': 'No data available to query'}, 200
+    
+    started = time.perf_counter()
+    result, cached = run_snapshot_query(tenant, snapshot, version, query)
+    took_ms = (time.perf_counter() - started) * 1000
+    
+    return {
+        'status': 'success',
+        'version': version,
+        'cached': cached,
+        'took_ms': round(took_ms, 3),
+        'freshness': snapshot_freshness(tenant),
+        'result': result
+    }, 200
+
+def stream_messages_since(tenant, last_seen):
+    """Return (current version, SSE messages) for a subscriber of a sheet that has seen last_seen"""
+    with snapshot_condition:
+        current = tenant.version
+        pending = [(version, base, payload) for version, base, payload in tenant.deltas if version > last_seen]
+    
+    if current == last_seen:
+        return current, []
+    
+    # Fell behind the delta buffer or has no base to patch: ask for a full reload
+    if not pending or pending[0][1] != last_seen or any(payload is None for _, _, payload in pending):
+        return current, [format_sse('reset', json.dumps({'version': current}), current)]
+    return current, [format_sse('delta', payload, version) for version, _, payload in pending]
+
+def snapshot_age(tenant):
+    """Seconds since the sheet's snapshot was fetched, or None without a snapshot"""
+    if tenant.last_update is None:
+        return None
+    return max(0.0, (datetime.now() - tenant.last_update).total_seconds())
+
+def snapshot_freshness(tenant):
+    """Staleness fields for JSON responses"""
+    age = snapshot_age(tenant)
+    return {
+        'age': round(age, 1) if age is not None else None,
+        'stale': age is None or age > STALE_AFTER_SECONDS,
+        'max_staleness': MAX_STALENESS_SECONDS
+    }
+
+def next_refresh_in(tenant):
+    """Seconds until the sheet's snapshot is due to be refreshed; polling sooner only gets a 304"""
+    remaining = REFRESH_INTERVAL_SECONDS - snapshot_age(tenant)
+    # An overdue refresh is in flight or failing; check back like a revalidating client would
+    return int(remaining) + 1 if remaining > 0 else REVALIDATE_RETRY_SECONDS
+
+def freshness_headers(tenant):
+    """Age, staleness and next-refresh headers for responses built from a sheet's snapshot"""
+    age = snapshot_age(tenant)
+    if age is None:
+        return {}
+    return {
+        'Age': str(int(age)),
+        'X-Snapshot-Version': str(tenant.version),
+        'X-Snapshot-Stale': '1' if age > STALE_AFTER_SECONDS else '0',
+        'X-Next-Refresh': str(next_refresh_in(tenant))
+    }
+
+def snapshot_expired(tenant):
+    """True if the snapshot is past the hard staleness limit and the policy rejects it"""
+    age = snapshot_age(tenant)
+    return MAX_STALENESS_POLICY == 'reject' and age is not None and age > MAX_STALENESS_SECONDS
+
+def expired_snapshot_body():
+    return {'status': 'error', 'message': f'Data is more than {MAX_STALENESS_SECONDS}s old and is being refreshed'}
+
+def cold_snapshot_body(tenant):
+    """/api/data body while a sheet's first snapshot is still being fetched"""
+    if tenant.fetch_failed and not tenant.revalidating:
+        return {'data': None, 'last_update': None, 'version': 0, 'status': 'error',
+                'message': 'Failed to fetch data. Please check your sheet URL and sharing settings.'}
+    return {'data': None, 'last_update': None, 'version': 0, 'status': 'pending'}
+
+def revalidate_in_background(tenant):
+    """Refresh a sheet off the request path if its snapshot is missing or stale"""
+    age = snapshot_age(tenant)
+    if age is not None and age <= STALE_AFTER_SECONDS:
+        return
+    # Followers leave refreshing to the leader, except for sheets nobody has published yet
+    if tenant.data is not None and leader_lease is not None and not leader_lease.holds_lease():
+        return
+    
+    with revalidate_lock:
+        if tenant.revalidating or time.time() - tenant.last_revalidate < REVALIDATE_RETRY_SECONDS:
+            return
+        tenant.revalidating = True
+        tenant.last_revalidate = time.time()
+    threading.Thread(target=revalidate_snapshot, args=(tenant,), daemon=True).start()
+
+def revalidate_snapshot(tenant):
+    try:
+        tenant.fetch_failed = fetch_sheet_data(tenant.sheet_url) is None and tenant.data is None
+    finally:
+        tenant.revalidating = False
+
+def parse_time_arg(value, default=None):
+    """Epoch seconds or an ISO timestamp from a query argument"""
+    if value in (None, ''):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def history_response(tenant, args):
+    """Build the /api/history response body"""
+    try:
+        end = parse_time_arg(args.get('to'), time.time())
+        start = parse_time_arg(args.get('from'), end - 24 * 3600)
+        points = min(max(int(args.get('points', 500)), 1), HISTORY_MAX_POINTS)
+    except ValueError:
+        return {'status': 'error', 'message': 'from/to must be epoch seconds or ISO timestamps and points an integer'}
+    
+    fields = [name.strip() for name in args.get('fields', '').split(',') if name.strip()] or list(HISTORY_FIELDS)
+    unknown = [name for name in fields if name not in HISTORY_FIELDS]
+    if unknown:
+        return {'status': 'error', 'message': f"Unknown history fields: {', '.join(unknown)}"}
+    aggregate = args.get('agg', 'mean')
+    if aggregate not in AGGREGATES:
+        return {'status': 'error', 'message': f"agg must be one of {', '.join(AGGREGATES)}"}
+    
+    history = tenant_history(tenant)
+    history.catch_up()
+    result = history.query(start, end, fields, max_points=points, aggregate=aggregate)
+    return {
+        'status': 'success',
+        'from': start,
+        'to': end,
+        'fields': fields,
+        'aggregate': aggregate if result['downsampled'] else None,
+        **result
+    }
+
+def snapshot_chart_body(tenant, snapshot, version, name):
+    charts = get_snapshot_artifact(tenant, 'charts', snapshot, version, lambda snapshot: build_snapshot_charts(snapshot['metrics']))
+    return {'status': 'success', 'chart': name, 'version': version, **charts[name]}
+
+def chart_response(tenant, name, args):
+    """Build the /api/charts/<name> response body"""
+    try:
+        width = min(max(int(args.get('width', 800)), 3), CHART_MAX_WIDTH)
+    except ValueError:
+        return {'status': 'error', 'message': 'width must be an integer'}
+    
+    if name in SNAPSHOT_CHARTS:
+        snapshot, version = get_snapshot(tenant)
+        if snapshot is None:
+            return cold_snapshot_body(tenant)
+        return snapshot_chart_body(tenant, snapshot, version, name)
+    
+    try:
+        end = parse_time_arg(args.get('to'), time.time())
+        start = parse_time_arg(args.get('from'), end - 24 * 3600)
+    except ValueError:
+        return {'status': 'error', 'message': 'from/to must be epoch seconds or ISO timestamps'}
+    
+    if name == 'history':
+        field = args.get('field', 'success_rate')
+        if field not in HISTORY_FIELDS:
+            return {'status': 'error', 'message': f"field must be one of {', '.join(HISTORY_FIELDS)}"}
+        history = tenant_history(tenant)
+        history.catch_up()
+        points = history.query(start, end, [field])
+        timestamps, values = points['timestamps'], points['series'][field]
+    elif name == 'series':
+        key = args.get('key', 'total:all')
+        measure = args.get('measure', 'calls')
+        if measure not in SERIES_MEASURES and measure != 'success_rate':
+            return {'status': 'error', 'message': f"measure must be one of {', '.join(SERIES_MEASURES)}, success_rate"}
+        points, _ = tenant_timeseries(tenant).query([key], start, end)
+        timestamps = [timestamp for timestamp, _ in points[key]]
+        if measure == 'success_rate':
+            values = [round(calls / leads * 100, 2) if leads > 0 else 0 for _, (leads, calls, *_) in points[key]]
+        else:
+            values = [point[SERIES_MEASURES.index(measure)] for _, point in points[key]]
+    else:
+        return {'status': 'error', 'message': f"Unknown chart; use one of {', '.join(SNAPSHOT_CHARTS + ('history', 'series'))}"}
+    
+    # Never more points than the chart has pixels
+    labels, sampled = lttb(timestamps, values, width)
+    return {
+        'status': 'success',
+        'chart': name,
+        'from': start,
+        'to': end,
+        'points_in_range': len(timestamps),
+        'downsampled': len(labels) < len(timestamps),
+        'labels': labels,
+        'values': sampled
+    }
+
+def timeseries_response(tenant, args):
+    """Build the /api/timeseries response body"""
+    keys = [key.strip() for key in args.get('series', '').split(',') if key.strip()]
+    if not keys:
+        return {'status': 'error', 'message': 'series is required, e.g. series=total:all,client:<name>'}
+    tier = args.get('tier') or None
+    if tier is not None and tier not in TIERS:
+        return {'status': 'error', 'message': f"tier must be one of {', '.join(TIERS)}"}
+    try:
+        end = parse_time_arg(args.get('to'), time.time())
+        start = parse_time_arg(args.get('from'), end - 7 * 86400)
+    except ValueError:
+        return {'status': 'error', 'message': 'from/to must be epoch seconds or ISO timestamps'}
+    
+    started = time.perf_counter()
+    points, chunks_read = tenant_timeseries(tenant).query(keys, start, end, tier=tier)
+    series = {}
+    for key, key_points in points.items():
+        columns = list(zip(*(values for _, values in key_points))) or [()] * len(SERIES_MEASURES)
+        entry = {'timestamps': [timestamp for timestamp, _ in key_points]}
+        entry.update({measure: list(column) for measure, column in zip(SERIES_MEASURES, columns)})
+        entry['success_rate'] = [round(calls / leads * 100, 2) if leads > 0 else 0
+                                 for leads, calls in zip(entry['leads'], entry['calls'])]
+        series[key] = entry
+    
+    return {
+        'status': 'success',
+        'from': start,
+        'to': end,
+        'chunks_read': chunks_read,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+        'series': series
+    }
+
+# Named windows for /api/compare, ending at the current snapshot
+COMPARE_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400}
+
+def compare_series(before, after):
+    """Per-member deltas between two {series key: (leads, calls, live, total)} maps"""
+    groups = {'total': {}}
+    groups.update({group: {} for group in SERIES_GROUPS})
+    for key in sorted(set(before) | set(after)):
+        group, _, name = key.partition(':')
+        old = dict(zip(SERIES_MEASURES, before.get(key, (0,) * len(SERIES_MEASURES))))
+        new = dict(zip(SERIES_MEASURES, after.get(key, (0,) * len(SERIES_MEASURES))))
+        old_rate = round(old['calls'] / old['leads'] * 100, 2) if old['leads'] > 0 else 0
+        new_rate = round(new['calls'] / new['leads'] * 100, 2) if new['leads'] > 0 else 0
+        leads, calls = new['leads'] - old['leads'], new['calls'] - old['calls']
+        groups[group][name] = {
+            'leads': {'from': old['leads'], 'to': new['leads'], 'delta': leads},
+            'calls': {'from': old['calls'], 'to': new['calls'], 'delta': calls},
+            'success_rate': {'from': old_rate, 'to': new_rate, 'delta': round(new_rate - old_rate, 2)},
+            'live_campaigns': {'from': old['live_campaigns'], 'to': new['live_campaigns'],
+                               'delta': new['live_campaigns'] - old['live_campaigns']},
+            # Success rate of the activity inside the period itself
+            'period_success_rate': round(calls / leads * 100, 2) if leads > 0 else 0,
+            'new': key not in before,
+            'gone': key not in after
+        }
+    return groups
+
+def build_comparison(store, start, end, current=None):
+    """Compare the series at two times; `current` stands in for the end point when it is the live snapshot
+    
+    A period that starts before the oldest retained point is clamped to it (and flagged),
+    rather than reporting every member as new with its whole cumulative value as the delta.
+    """
+    started = time.perf_counter()
+    before, chunks_read = store.values_at(start)
+    clamped = False
+    if not before:
+        oldest = store.oldest_timestamp()
+        if oldest is None or oldest >= end:
+            return {
+                'status': 'insufficient_history',
+                'message': 'No history was recorded before the end of the period',
+                'from': start,
+                'to': end,
+                'oldest_snapshot_at': oldest
+            }
+        before, more = store.values_at(oldest)
+        chunks_read += more
+        clamped = True
+    if current is not None:
+        after = current
+    else:
+        after, more = store.values_at(end)
+        after = {key: values for key, (_, values) in after.items()}
+        chunks_read += more
+    before_times = [timestamp for timestamp, _ in before.values()]
+    return {
+        'status': 'success',
+        'from': start,
+        'to': end,
+        # The snapshot actually used for the start of the period; later than `from` when clamped
+        'from_snapshot_at': max(before_times),
+        'clamped': clamped,
+        'chunks_read': chunks_read,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+        'groups': compare_series({key: values for key, (_, values) in before.items()}, after)
+    }
+
+def rolling_response(tenant, args):
+    """Build the /api/rolling response body"""
+    group = args.get('group', 'client')
+    if group not in ROLLING_GROUPS:
+        return {'status': 'error', 'message': f"group must be one of {', '.join(ROLLING_GROUPS)}"}
+    try:
+        limit = int(args.get('limit', 100))
+    except (TypeError, ValueError):
+        limit = 0
+    if not 1 <= limit <= 1000:
+        return {'status': 'error', 'message': 'limit must be an integer from 1 to 1000'}
+    
+    rolling = tenant_rolling(tenant)
+    return {
+        'status': 'success',
+        'group': group,
+        'updated_at': rolling.updated_at,
+        'windows': rolling.windows(group, name=args.get('name'), sort=args.get('sort', '1h.calls'), limit=limit)
+    }
+
+def compare_response(tenant, args):
+    """Build the /api/compare response body"""
+    window = args.get('window')
+    if window:
+        if window not in COMPARE_WINDOWS:
+            return {'status': 'error', 'message': f"window must be one of {', '.join(COMPARE_WINDOWS)}"}
+        snapshot, version = get_snapshot(tenant)
+        if snapshot is None:
+            return cold_snapshot_body(tenant)
+        
+        # Ends at the current snapshot, so the result only changes with the version
+        def build(snapshot):
+            end = tenant.last_update.timestamp() if tenant.last_update else time.time()
+            result = build_comparison(tenant_timeseries(tenant), end - COMPARE_WINDOWS[window], end,
+                                      current=snapshot_series(snapshot['metrics']))
+            result.update(window=window, version=version)
+            return result
+        return get_snapshot_artifact(tenant, f'compare:{window}', snapshot, version, build)
+    
+    try:
+        start = parse_time_arg(args.get('from'))
+        end = parse_time_arg(args.get('to'), time.time())
+    except ValueError:
+        return {'status': 'error', 'message': 'from/to must be epoch seconds or ISO timestamps'}
+    if start is None or start >= end:
+        return {'status': 'error', 'message': 'Pass window=1h|24h|7d|30d, or from (and optionally to) with from < to'}
+    return build_comparison(tenant_timeseries(tenant), start, end)
+
+# Table columns the rows endpoint can sort by -> (row accessor, numeric)
+ROW_SORT_COLUMNS = {
+    'client': (lambda row: row.get('Client') or '', False),
+    'bot': (lambda row: row.get('Bot Name') or '', False),
+    'status': (lambda row: row.get('Campaign Status') or '', False),
+    'app_status': (lambda row: row.get('Application Status (Voice)') or '', False),
+    'monitoring': (lambda row: row.get('Monitoring') or '', False),
+    'reports': (lambda row: row.get('Reports') or '', False),
+    'cm': (lambda row: row.get(' reporting CM') or '', False),
+    'leads': (lambda row: row.get('Total leads dialled'), True),
+    'calls': (lambda row: row.get('Total connnected calls'), True)
+}
+ROW_FILTERS = ('status', 'app_status', 'bot_type')
+ROWS_MAX_LIMIT = 1000
+ROWS_SEARCH_LIMIT = 10000
+
+def build_row_order(snapshot, column):
+    """Row positions sorted ascending by one table column"""
+    accessor, numeric = ROW_SORT_COLUMNS[column]
+    rows = snapshot['raw_data']
+    if numeric:
+        return sorted(range(len(rows)), key=lambda position: parse_count(accessor(rows[position])))
+    return sorted(range(len(rows)), key=lambda position: accessor(rows[position]).strip().casefold())
+
+def rows_response(tenant, snapshot, version, args, archived=False):
+    """Build one page of the /api/rows response body"""
+    sort = args.get('sort') or None
+    if sort is not None and sort not in ROW_SORT_COLUMNS:
+        return {'status': 'error', 'message': f"sort must be one of {', '.join(ROW_SORT_COLUMNS)}"}
+    try:
+        offset = max(int(args.get('offset', 0)), 0)
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        return {'status': 'error', 'message': 'offset and limit must be integers'}
+    if limit is not None:
+        limit = min(max(limit, 1), ROWS_MAX_LIMIT)
+    
+    rows, keys = snapshot['raw_data'], snapshot['row_keys']
+    if sort is None:
+        positions = range(len(rows))
+    elif archived:
+        positions = build_row_order(snapshot, sort)
+    else:
+        # One sort per column and version; every page and scroll position reuses it
+        positions = get_snapshot_artifact(tenant, f'order:{sort}', snapshot, version,
+                                          lambda snapshot: build_row_order(snapshot, sort))
+    if args.get('order') == 'desc':
+        positions = positions[::-1]
+    
+    query = (args.get('q') or '').strip()
+    if query:
+        if archived:
+            index = CampaignSearchIndex().build(keys, rows)
+        else:
+            with search_lock:
+                index = tenant.search_index
+        matches = index.search(query, limit=ROWS_SEARCH_LIMIT) if index is not None else []
+        if sort is None:
+            # Unsorted searches keep relevance order
+            position_of = {key: position for position, key in enumerate(keys)}
+            positions = [position_of[key] for key, _, _ in matches if key in position_of]
+        else:
+            matched = {key for key, _, _ in matches}
+            positions = [position for position in positions if keys[position] in matched]
+    
+    filters = {
+        name: args[f'filter.{name}'].casefold()
+        for name in ROW_FILTERS if args.get(f'filter.{name}')
+    }
+    if filters:
+        positions = [
+            position for position in positions
+            if all(value in DIMENSIONS[name][0](rows[position]).casefold() for name, value in filters.items())
+        ]
+    
+    total = len(positions)
+    page = positions[offset:offset + limit] if limit is not None else positions[offset:]
+    return {
+        'status': 'success',
+        'version': version,
+        'total': total,
+        'offset': offset,
+        'count': len(page),
+        'rows': [{'key': keys[position], 'row': rows[position]} for position in page]
+    }
+
+BATCH_MAX_WIDGETS = 20
+# Parameters each widget reads; anything else is dropped before the widget is evaluated or cached
+WIDGET_PARAMS = {
+    'kpis': (),
+    'chart': ('name', 'width', 'from', 'to', 'field', 'key', 'measure'),
+    'rows': ('sort', 'order', 'offset', 'limit', 'q') + tuple(f'filter.{name}' for name in ROW_FILTERS),
+    'query': ('dimensions', 'measures', 'filters', 'limit'),
+    'history': ('from', 'to', 'points', 'fields', 'agg'),
+    'timeseries': ('series', 'tier', 'from', 'to'),
+    'compare': ('window', 'from', 'to'),
+    'rolling': ('group', 'limit', 'name', 'sort')
+}
+WIDGET_PARAM_MAX_LENGTH = 1000
+# Fields that differ between otherwise identical results; they do not change a widget's ETag,
+# so a widget whose content survived a new snapshot version is still "unchanged"
+VOLATILE_WIDGET_FIELDS = ('took_ms', 'cached', 'freshness', 'version', 'last_update')
+
+def evaluate_widget(tenant, snapshot, version, widget_type, params):
+    """One widget's result, computed from the given snapshot where the widget reads the snapshot"""
+    if widget_type == 'kpis':
+        return get_snapshot_artifact(tenant, 'initial_payload', snapshot, version,
+                                     lambda snapshot: build_initial_payload(tenant, snapshot, version))
+    if widget_type == 'chart':
+        name = params.get('name', '')
+        if name in SNAPSHOT_CHARTS:
+            return snapshot_chart_body(tenant, snapshot, version, name)
+        return chart_response(tenant, name, params)
+    if widget_type == 'rows':
+        return rows_response(tenant, snapshot, version, params)
+    if widget_type == 'query':
+        try:
+            query = normalize_query(params.get('dimensions'), params.get('measures'),
+                                    params.get('filters'), params.get('limit', 100))
+        except QueryError as e:
+            return {'status': 'error', 'message': str(e)}
+        result, _ = run_snapshot_query(tenant, snapshot, version, query)
+        return {'status': 'success', 'version': version, 'result': result}
+    if widget_type == 'history':
+        return history_response(tenant, params)
+    if widget_type == 'timeseries':
+        return timeseries_response(tenant, params)
+    if widget_type == 'compare':
+        return compare_response(tenant, params)
+    if widget_type == 'rolling':
+        return rolling_response(tenant, params)
+    return {'status': 'error', 'message': f'Unknown widget type: {widget_type}'}
+
+def normalize_widget_params(widget_type, params):
+    """Canonical parameters of a widget (query arguments as strings), or raise QueryError"""
+    if widget_type not in WIDGET_PARAMS:
+        raise QueryError(f"Unknown widget type: {widget_type}; use one of {', '.join(WIDGET_PARAMS)}")
+    if not isinstance(params, dict):
+        raise QueryError('params must be an object')
+    if widget_type == 'query':
+        return normalize_query(params.get('dimensions'), params.get('measures'),
+                               params.get('filters'), params.get('limit', 100))
+    
+    normalized = {}
+    for name in WIDGET_PARAMS[widget_type]:
+        value = params.get(name)
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise QueryError(f'{name} must be a string or a number')
+        value = str(value)
+        if len(value) > WIDGET_PARAM_MAX_LENGTH:
+            raise QueryError(f'{name} is longer than {WIDGET_PARAM_MAX_LENGTH} characters')
+        normalized[name] = value
+    return normalized
+
+def build_widget(tenant, snapshot, version, widget_type, params):
+    """(etag, result, size) for a widget; the ETag depends only on the result's content"""
+    result = evaluate_widget(tenant, snapshot, version, widget_type, params)
+    stable = {name: value for name, value in result.items() if name not in VOLATILE_WIDGET_FIELDS}
+    encoded = json.dumps(stable, sort_keys=True, default=str).encode('utf-8')
+    return f'"{hashlib.sha1(encoded).hexdigest()[:16]}"', result, len(encoded)
+
+def batch_response(tenant, widgets):
+    """Build the /api/batch response body: every widget evaluated against one snapshot version"""
+    if not isinstance(widgets, list) or not widgets:
+        return {'status': 'error', 'message': 'widgets must be a non-empty list'}
+    if len(widgets) > BATCH_MAX_WIDGETS:
+        return {'status': 'error', 'message': f'At most {BATCH_MAX_WIDGETS} widgets per batch'}
+    
+    snapshot, version = get_snapshot(tenant)
+    if snapshot is None:
+        return cold_snapshot_body(tenant)
+    results = []
+    for position, widget in enumerate(widgets):
+        widget = widget if isinstance(widget, dict) else {}
+        widget_id = widget.get('id', position)
+        widget_type = widget.get('type', '')
+        try:
+            params = normalize_widget_params(widget_type, widget.get('params') or {})
+        except QueryError as e:
+            results.append({'id': widget_id, 'type': widget_type, 'result': {'status': 'error', 'message': str(e)}})
+            continue
+        
+        # Keyed on the canonical parameters, so equivalent widgets share an entry
+        key = (tenant.key, version, widget_type, query_key(params))
+        cached = widget_cache.get(key)
+        if cached is None:
+            etag, result, size = build_widget(tenant, snapshot, version, widget_type, params)
+            widget_cache.put(key, (etag, result), size)
+        else:
+            etag, result = cached
+        if widget.get('etag') == etag:
+            # The client already holds this result
+            results.append({'id': widget_id, 'type': widget_type, 'etag': etag, 'unchanged': True})
+        else:
+            results.append({'id': widget_id, 'type': widget_type, 'etag': etag, 'unchanged': False, 'result': result})
+    
+    return {
+        'status': 'success',
+        'version': version,
+        'freshness': snapshot_freshness(tenant),
+        'widgets': results
+    }
+
+def format_sse(event, data, event_id=None):
+    """Format a single Server-Sent Events message"""
+    message = f'event: {event}\n'
+    if event_id is not None:
+        message += f'id: {event_id}\n'
+    return message + f'data: {data}\n\n'
+
+def refresh_targets():
+    """Sheets the refresh loop should fetch: viewed here, by another worker, or by an API node"""
+    tenants = tenant_cache.active_tenants(VIEWER_TTL_SECONDS)
+    keys = []
+    if shared_store is not None:
+        keys += shared_store.viewed_keys(VIEWER_TTL_SECONDS)
+    if APP_ROLE == 'ingest':
+        keys += snapshot_directory.interested_keys(VIEWER_TTL_SECONDS)
+    
+    seen = {tenant.key for tenant in tenants}
+    for key in keys:
+        if key not in seen:
+            seen.add(key)
+            tenant = resolve_tenant(key)
+            if tenant:
+                tenants.append(tenant)
+    return tenants
+
+def shared_snapshot_is_fresh(tenant):
+    """True if any process published this sheet within the refresh interval"""
+    if shared_store is None or APP_ROLE == 'api':
+        return False
+    shared = shared_store.current(tenant.key)
+    return shared is not None and time.time() - shared.published_at < REFRESH_INTERVAL_SECONDS - 1
+
+def seed_snapshot_version():
+    """Continue the version counter after the highest version any process shared"""
+    global snapshot_version
+    
+    if shared_store is None:
+        return
+    latest = shared_store.latest_version()
+    with update_lock:
+        snapshot_version = max(snapshot_version, latest)
+
+def auto_refresh():
+    """Auto-refresh every sheet with active viewers every minute"""
+    seeded = False
+    while True:
+        if leader_lease is not None and not leader_lease.holds_lease():
+            # Followers only adopt the leader's snapshots; wake up once elected
+            seeded = False
+            leader_lease.elected.wait()
+            continue
+        if not seeded:
+            # A new leader never reissues a version the previous one published for any sheet
+            seed_snapshot_version()
+            seeded = True
+        
+        tenant_cache.expire_empty()
+        for tenant in refresh_targets():
+            # A newly elected leader skips sheets the previous leader just fetched
+            if shared_snapshot_is_fresh(tenant):
+                continue
+            try:
+                version = tenant.version
+                fetch_sheet_data(tenant.sheet_url)
+                if tenant.version != version:
+                    print(f"Data refreshed for {tenant.key} at {datetime.now()}")
+            except Exception as e:
+                print(f"Error in auto-refresh: {e}")
+        # API nodes only read manifests, so they can look for new snapshots far more often
+        time.sleep(SNAPSHOT_POLL_SECONDS if APP_ROLE == 'api' else REFRESH_INTERVAL_SECONDS)
+
+def start_refresher():
+    """Start the background refresh machinery for this process
+    
+    In shared mode every process runs the same loop: the lease decides which one fetches,
+    and the rest adopt its snapshots.
+    """
+    if leader_lease is not None:
+        leader_lease.start()
+        atexit.register(leader_lease.release)
+        start_shared_watcher()
+    threading.Thread(target=auto_refresh, daemon=True).start()
+
+def watch_shared_snapshots():
+    """Adopt snapshots published by the refresher for sheets this worker serves"""
+    while True:
+        # Followers never run the refresh loop, which expires empty tenants on the leader
+        tenant_cache.expire_empty()
+        for tenant in tenant_cache.active_tenants(VIEWER_TTL_SECONDS):
+            try:
+                adopt_shared_snapshot(tenant)
+            except Exception as e:
+                print(f"Error adopting shared snapshot: {e}")
+        time.sleep(SHARED_SNAPSHOT_POLL_SECONDS)
+
+def start_shared_watcher():
+    """Start the shared snapshot watcher in a worker process"""
+    threading.Thread(target=watch_shared_snapshots, daemon=True).start()
+
+def build_initial_payload(tenant, snapshot, version):
+    """The KPI subset of a snapshot that the dashboard page embeds"""
+    metrics = snapshot['metrics']
+    return {
+        'sheet': tenant.key,
+        'version': version,
+        'last_update': tenant.last_update.isoformat() if tenant.last_update else None,
+        'metrics': {
+            name: metrics.get(name, 0)
+            for name in ('total_clients', 'live_campaigns', 'total_leads_dialled', 'total_connected_calls', 'success_rate')
+        },
+        'performance_metrics': metrics.get('performance_metrics') or {}
+    }
 
 @app.route('/')
 def dashboard():
-    """Main dashboard page"""
-    return render_template('comprehensive_dashboard.html')
+    """Main dashboard page, with the current KPIs inlined when a snapshot is available"""
+    if not INLINE_INITIAL_PAYLOAD:
+        return render_template('comprehensive_dashboard.html', initial=None)
+    
+    tenant = request_tenant()
+    snapshot, version = get_snapshot(tenant) if tenant else (None, 0)
+    if snapshot is None or snapshot_expired(tenant):
+        return render_template('comprehensive_dashboard.html', initial=None)
+    
+    etag = snapshot_etag(tenant, version, 'page')
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    
+    # Rendered once per snapshot version; every later visit is served from memory
+    initial = get_snapshot_artifact(tenant, 'initial_payload', snapshot, version,
+                                    lambda snapshot: build_initial_payload(tenant, snapshot, version))
+    page = get_snapshot_artifact(tenant, 'dashboard_html', snapshot, version,
+                                 lambda snapshot: render_template('comprehensive_dashboard.html', initial=initial).encode('utf-8'))
+    return Response(page, mimetype='text/html', headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+def request_tenant(sheet=None):
+    """Resolve the sheet a request is for (?sheet=<key or URL>) and mark it as viewed"""
+    tenant = resolve_tenant(sheet if sheet is not None else request.args.get('sheet'))
+    if tenant:
+        tenant.touch()
+        adopt_shared_snapshot(tenant)
+        revalidate_in_background(tenant)
+        g.tenant = tenant
+    return tenant
+
+def unknown_sheet_response():
+    return jsonify({'status': 'error', 'message': 'Invalid sheet URL'})
+
+def expired_snapshot_response():
+    return jsonify(expired_snapshot_body()), 503, {'Retry-After': str(REVALIDATE_RETRY_SECONDS)}
+
+@app.before_request
+def label_request_route():
+    """Label request metrics with the URL rule, so /api/charts/<name> is one route"""
+    set_route(request.url_rule.rule if request.url_rule else None)
+
+@app.after_request
+def add_freshness_headers(response):
+    """Tell clients how old the snapshot behind a read response is"""
+    tenant = g.get('tenant')
+    if tenant is not None and response.status_code in (200, 304) and response.mimetype != 'text/event-stream':
+        response.headers.extend(freshness_headers(tenant))
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker script, served from the root so its scope covers the dashboard page"""
+    response = app.send_static_file('js/service_worker.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/data')
 def get_data():
-    """API endpoint to get current data"""
-    global cached_data, last_update
+    """API endpoint to get current data (or, with ?at=<time>, the data shown at that time)"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
     
-    with update_lock:
-        if cached_data is None:
-            # Try to fetch data if not cached
-            fetch_sheet_data()
+    if request.args.get('at'):
+        return archived_data_response(tenant, request.args['at'])
+    
+    snapshot, version = get_snapshot(tenant)
+    if snapshot is None:
+        # The first fetch runs in the background; clients retry shortly
+        return jsonify(cold_snapshot_body(tenant)), 200, {'Retry-After': '2'}
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    
+    # Clients holding this version (e.g. from their offline cache) only need to hear it is current
+    etag = snapshot_etag(tenant, version, 'data')
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    
+    # Serialized once per version and shared by every poller
+    body = get_snapshot_artifact(tenant, 'data_json', snapshot, version, lambda data: build_data_payload(data, version, tenant.last_update))
+    return Response(body, mimetype='application/json', headers={'ETag': etag})
+
+def archived_data_response(tenant, at):
+    """/api/data as it was at a past time, rebuilt from the archive"""
+    try:
+        at = parse_time_arg(at)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'at must be epoch seconds or an ISO timestamp'})
+    
+    entry, snapshot = snapshot_as_of(tenant, at)
+    if entry is None:
+        return jsonify({'status': 'error', 'message': 'No snapshot retained for that time'}), 404
+    
+    last_update = datetime.fromisoformat(entry['last_update']) if entry['last_update'] else None
+    return Response(
+        build_data_payload(snapshot, entry['version'], last_update),
+        mimetype='application/json',
+        headers={'X-Snapshot-As-Of': str(entry['t']), 'X-Snapshot-Version': str(entry['version'])}
+    )
+
+@app.route('/api/rows')
+def get_rows():
+    """Campaign rows with their stable keys, paged for the dashboard table
+
+    ?offset=&limit=&sort=<column>&order=asc|desc&q=<search>&filter.<status|app_status|bot_type>=<value>,
+    now or (?at=<time>) as they were at a past time
+    """
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    
+    if request.args.get('at'):
+        try:
+            at = parse_time_arg(request.args['at'])
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'at must be epoch seconds or an ISO timestamp'})
+        entry, snapshot = snapshot_as_of(tenant, at)
+        if entry is None:
+            return jsonify({'status': 'error', 'message': 'No snapshot retained for that time'}), 404
+        version, as_of = entry['version'], entry['t']
+    else:
+        snapshot, version = get_snapshot(tenant)
+        if snapshot is None:
+            return jsonify(cold_snapshot_body(tenant)), 200, {'Retry-After': '2'}
+        if snapshot_expired(tenant):
+            return expired_snapshot_response()
+        as_of = None
+    
+    body = rows_response(tenant, snapshot, version, request.args, archived=as_of is not None)
+    body['as_of'] = as_of
+    return jsonify(body)
+
+@app.route('/api/stream')
+def stream_updates():
+    """Server-Sent Events stream of snapshot deltas"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    
+    # EventSource resends the last seen id when it reconnects
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since else tenant.version
+    except ValueError:
+        since = tenant.version
+    
+    def generate():
+        last_seen = since
+        with snapshot_condition:
+            tenant.subscribers += 1
         
-        return jsonify({
-            'data': cached_data,
-            'last_update': last_update.isoformat() if last_update else None,
-            'status': 'success'
-        })
+        try:
+            yield 'retry: 5000\n\n'
+            
+            while True:
+                with snapshot_condition:
+                    if tenant.version == last_seen:
+                        snapshot_condition.wait(timeout=STREAM_HEARTBEAT_SECONDS)
+                
+                current, messages = stream_messages_since(tenant, last_seen)
+                if not messages:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                for message in messages:
+                    yield message
+                last_seen = current
+        finally:
+            with snapshot_condition:
+                tenant.subscribers -= 1
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/search')
+def search_campaigns():
+    """Search campaigns by client, bot name, reporting CM or monitoring ID"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    
+    return jsonify(search_response(
+        tenant,
+        request.args.get('q', '').strip(),
+        limit=request.args.get('limit', 20, type=int),
+        fuzzy=request.args.get('fuzzy', '1') != '0'
+    ))
+
+@app.route('/api/query', methods=['GET', 'POST'])
+def query_campaigns():
+    """Group campaigns by arbitrary dimensions with optional filters"""
+    if request.method == 'POST':
+        params = request.get_json(silent=True)
+        if params is None:
+            return jsonify({'status': 'error', 'message': 'POST a JSON object'}), 400
+        tenant = request_tenant(params.get('sheet') if isinstance(params, dict) else None)
+    else:
+        params = query_params_from_args(request.args)
+        tenant = request_tenant()
+    
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    body, status = query_response(tenant, params)
+    return jsonify(body), status
+
+@app.route('/api/history')
+def metric_history():
+    """Headline metrics over time: ?from=&to=&fields=&points=&agg=mean|min|max|last"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    return jsonify(history_response(tenant, request.args))
+
+@app.route('/api/timeseries')
+def long_term_series():
+    """Long-term per-client/CM/bot counters: ?series=total:all,client:<name>&from=&to=&tier=minute|hour|day"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    return jsonify(timeseries_response(tenant, request.args))
+
+@app.route('/api/compare')
+def compare_periods():
+    """Per-client/CM/bot deltas between two times: ?from=&to= or ?window=1h|24h|7d|30d"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    return jsonify(compare_response(tenant, request.args))
+
+@app.route('/api/charts/<name>')
+def chart_data(name):
+    """Chart.js-ready labels/values: snapshot charts, or history/series downsampled to ?width= points"""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    return jsonify(chart_response(tenant, name, request.args))
+
+@app.route('/api/batch', methods=['POST'])
+def batch_widgets():
+    """Evaluate several widget queries against one snapshot version in a single round trip
+
+    Body: {"sheet": ..., "widgets": [{"id": "kpis", "type": "kpis"}, {"id": "status", "type": "chart",
+    "params": {"name": "status"}, "etag": "<from a previous batch>"}, ...]}
+    Widgets whose etag still matches come back as {"unchanged": true} without a result.
+    """
+    body = request.get_json(silent=True) or {}
+    tenant = request_tenant(body.get('sheet') or request.args.get('sheet'))
+    if not tenant:
+        return unknown_sheet_response()
+    
+    snapshot, _ = get_snapshot(tenant)
+    if snapshot is None:
+        return jsonify(cold_snapshot_body(tenant)), 200, {'Retry-After': '2'}
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    return jsonify(batch_response(tenant, body.get('widgets')))
+
+@app.route('/api/rolling')
+def rolling_windows():
+    """Leads and calls over the last 1h, 24h and 7d per client or bot: ?group=client|bot&name=&sort=1h.calls&limit="""
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    
+    body = rolling_response(tenant, request.args)
+    return jsonify(body), 400 if body['status'] == 'error' else 200
+
+@app.route('/api/tenants')
+def tenant_status():
+    """Sheets currently held in the cache, and the size and hit counts of the result caches"""
+    return jsonify({
+        'status': 'success',
+        'cache': tenant_cache.stats(),
+        'query_cache': query_cache.stats(),
+        'widget_cache': widget_cache.stats(),
+        'leader': leader_lease.status() if leader_lease is not None else None
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Refresh pipeline and snapshot metrics in the Prometheus text format"""
+    # Snapshot gauges are read at scrape time rather than kept up to date on every request
+    for tenant in tenant_cache.all_tenants():
+        age = snapshot_age(tenant)
+        if age is not None:
+            snapshot_age_seconds.set(round(age, 3), sheet=tenant.key)
+            snapshot_version_info.set(tenant.version, sheet=tenant.key)
+            snapshot_bytes.set(tenant.size, sheet=tenant.key)
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/refresh', methods=['POST'])
 def manual_refresh():
@@ -392,7 +1974,12 @@ def update_config():
     if sheet_url:
         result = fetch_sheet_data(sheet_url)
         if result:
-            return jsonify({'status': 'success', 'message': 'Configuration updated successfully'})
+            tenant = request_tenant(sheet_url)
+            return jsonify({'status': 'success', 'message': 'Configuration updated successfully', 'sheet': tenant.key})
+        elif APP_ROLE == 'api' and request_tenant(sheet_url):
+            # The interest marker makes the ingest node pick the sheet up on its next cycle
+            tenant = request_tenant(sheet_url)
+            return jsonify({'status': 'success', 'message': 'Sheet registered; data appears after the next ingest cycle', 'sheet': tenant.key})
         else:
             return jsonify({'status': 'error', 'message': 'Failed to access the sheet. Please ensure the sheet is publicly viewable or shared correctly.'})
     
@@ -400,31 +1987,51 @@ def update_config():
 
 @app.route('/api/export')
 def export_data():
-    """Export data as CSV"""
-    global cached_data
+    """Export data as CSV, Parquet or Arrow IPC"""
+    export_format = request.args.get('format', 'csv').lower()
+    tenant = request_tenant()
+    if not tenant:
+        return unknown_sheet_response()
     
-    with update_lock:
-        if cached_data and cached_data.get('raw_data'):
-            # Create CSV response
-            from flask import Response
-            
-            output = StringIO()
-            writer = csv.DictWriter(output, fieldnames=cached_data['raw_data'][0].keys())
-            writer.writeheader()
-            writer.writerows(cached_data['raw_data'])
-            
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={'Content-Disposition': 'attachment; filename=campaign_data.csv'}
-            )
+    # Snapshots are never mutated after publishing, so no lock is held while exporting
+    snapshot, version = get_snapshot(tenant)
+    if not snapshot or not snapshot.get('raw_data'):
+        return jsonify({'status': 'error', 'message': 'No data available to export'})
+    if snapshot_expired(tenant):
+        return expired_snapshot_response()
+    
+    etag = snapshot_etag(tenant, version, export_format)
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    
+    if export_format == 'csv':
+        return Response(
+            generate_csv_export(snapshot['raw_data']),
+            mimetype='text/csv',
+            headers={'Content-Disposition': 'attachment; filename=campaign_data.csv', 'ETag': etag}
+        )
+    
+    exporters = {
+        'parquet': (build_parquet_export, 'application/vnd.apache.parquet', 'campaign_data.parquet'),
+        'arrow': (build_arrow_export, 'application/vnd.apache.arrow.file', 'campaign_data.arrow')
+    }
+    if export_format not in exporters:
+        return jsonify({'status': 'error', 'message': f'Unsupported export format: {export_format}'})
+    if pa is None:
+        return jsonify({'status': 'error', 'message': 'Parquet and Arrow exports require pyarrow to be installed'})
+    
+    builder, mimetype, filename = exporters[export_format]
+    body = get_snapshot_artifact(tenant, f'export:{export_format}', snapshot, version, lambda data: builder(tenant, data, version))
     
-    return jsonify({'status': 'error', 'message': 'No data available to export'})
+    return Response(
+        body,
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}', 'ETag': etag}
+    )
 
 if __name__ == '__main__':
     # Start auto-refresh thread
-    refresh_thread = threading.Thread(target=auto_refresh, daemon=True)
-    refresh_thread.start()
+    start_refresher()
     
     # Initial data fetch
     fetch_sheet_data()
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the comprehensive dashboard
+
+Workers run the ASGI app (asgi_app.py) under uvicorn: every dashboard keeps an
+/api/stream subscription open, which would pin a sync worker per viewer but
+costs an event-loop coroutine here. The app's lifespan startup starts the
+refresh loop in each worker.
+
+Workers share one copy of each snapshot through memory-mapped files in
+SHARED_SNAPSHOT_DIR. Every worker runs the refresh loop, but a lease file in the
+same directory elects exactly one of them to fetch the sheets.
+"""
+import os
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = 'uvicorn.workers.UvicornWorker'
+wsgi_app = 'asgi_app:app'
+
+# Set before workers import the app so every process agrees on the directory
+os.environ.setdefault('SHARED_SNAPSHOT_DIR', '/dev/shm/campaign-dashboard')
@@ -0,0 +1,105 @@
+"""
+Lease-based leader election over a shared directory
+Exactly one process holding a fresh lease polls Google Sheets; if it dies, the
+lease expires and another process takes over within ttl + renew interval
+"""
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+class LeaderLease:
+    """A renewable lease stored as a small JSON file next to a flock guard"""
+
+    def __init__(self, path, ttl=30, identity=None):
+        self.path = path
+        self.ttl = ttl
+        self.renew_interval = ttl / 3
+        self.fixed_identity = identity
+        self.is_leader = False
+        self.expires_at = 0.0
+        self.elected = threading.Event()  # set whenever this process holds the lease
+
+    @property
+    def identity(self):
+        # Resolved on use: the lease object may be created before gunicorn forks its workers
+        return self.fixed_identity or f'{socket.gethostname()}:{os.getpid()}'
+
+    def read(self):
+        """Current lease contents, or None"""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def try_acquire(self):
+        """Take or renew the lease if it is ours or has expired"""
+        now = time.time()
+        with open(self.path + '.lock', 'a') as guard:
+            # The guard only serializes the read-modify-write; it is held for microseconds
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            try:
+                lease = self.read()
+                if lease and lease.get('holder') != self.identity and lease.get('expires', 0) > now:
+                    return False
+
+                temp_path = f'{self.path}.{os.getpid()}.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump({'holder': self.identity, 'expires': now + self.ttl, 'renewed': now}, f)
+                os.replace(temp_path, self.path)
+                self.expires_at = now + self.ttl
+                return True
+            finally:
+                fcntl.flock(guard, fcntl.LOCK_UN)
+
+    def release(self):
+        """Give up the lease so another process can take over immediately"""
+        with open(self.path + '.lock', 'a') as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            try:
+                lease = self.read()
+                if lease and lease.get('holder') == self.identity:
+                    os.remove(self.path)
+            finally:
+                fcntl.flock(guard, fcntl.LOCK_UN)
+        self._set_leader(False)
+
+    def holds_lease(self):
+        """True while this process is leader and its last renewal has not run out"""
+        return self.is_leader and time.time() < self.expires_at
+
+    def _set_leader(self, leader):
+        if leader != self.is_leader:
+            print(f"{self.identity} {'acquired' if leader else 'lost'} refresh leadership")
+        self.is_leader = leader
+        if leader:
+            self.elected.set()
+        else:
+            self.elected.clear()
+
+    def run(self):
+        """Keep trying to take or renew the lease (run in a daemon thread)"""
+        while True:
+            try:
+                self._set_leader(self.try_acquire())
+            except OSError as e:
+                print(f"Error renewing leader lease: {e}")
+                self._set_leader(False)
+            time.sleep(self.renew_interval)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def status(self):
+        lease = self.read() or {}
+        return {
+            'identity': self.identity,
+            'is_leader': self.is_leader,
+            'holder': lease.get('holder'),
+            'expires': lease.get('expires'),
+            'ttl': self.ttl
+        }
@@ -0,0 +1,192 @@
+"""
+Time series of dashboard metrics, one point per refresh
+
+Points live in a fixed-capacity ring of preallocated arrays (one per field), so
+appending is O(1) and a range is two binary searches. Every point is also
+appended to fixed-size records in on-disk segment files, which rebuild the ring
+after a restart and let processes that do not refresh catch up with the one
+that does.
+"""
+import os
+import struct
+import threading
+import time
+from array import array
+
+# field -> array typecode
+HISTORY_FIELDS = {
+    'total_clients': 'q',
+    'live_campaigns': 'q',
+    'total_leads_dialled': 'q',
+    'total_connected_calls': 'q',
+    'success_rate': 'd'
+}
+SEGMENT_RECORDS = 1440      # one day of minute-level refreshes per segment file
+MAX_SEGMENTS = 400
+CATCH_UP_INTERVAL = 1.0
+AGGREGATES = ('mean', 'min', 'max', 'last')
+
+class MetricRing:
+    """Fixed-capacity ring buffer of timestamped metric values"""
+
+    def __init__(self, capacity, fields=None):
+        self.capacity = capacity
+        self.fields = dict(fields or HISTORY_FIELDS)
+        self.times = array('d', bytes(8 * capacity))
+        self.columns = {name: array(code, bytes(8 * capacity)) for name, code in self.fields.items()}
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, values):
+        """Add a point, overwriting the oldest one when full"""
+        if self.count < self.capacity:
+            slot = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            slot = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[slot] = timestamp
+        for name, column in self.columns.items():
+            column[slot] = values.get(name) or 0
+
+    def time_at(self, position):
+        return self.times[(self.start + position) % self.capacity]
+
+    def bisect(self, timestamp):
+        """First logical position whose timestamp is >= timestamp"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time_at(mid) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def query(self, start=None, end=None, fields=None, max_points=None, aggregate='mean'):
+        """Points in [start, end], downsampled into at most max_points time buckets"""
+        fields = [name for name in (fields or self.fields) if name in self.columns]
+        lo = self.bisect(start) if start is not None else 0
+        hi = self.bisect(end + 1e-9) if end is not None else self.count
+        slots = [(self.start + position) % self.capacity for position in range(lo, hi)]
+
+        if max_points and len(slots) > max_points:
+            return self._downsample(slots, fields, max_points, aggregate)
+
+        return {
+            'timestamps': [self.times[slot] for slot in slots],
+            'series': {name: [self.columns[name][slot] for slot in slots] for name in fields},
+            'downsampled': False
+        }
+
+    def _downsample(self, slots, fields, max_points, aggregate):
+        first, last = self.times[slots[0]], self.times[slots[-1]]
+        width = (last - first) / max_points or 1.0
+        buckets = {}
+        for slot in slots:
+            bucket = min(int((self.times[slot] - first) / width), max_points - 1)
+            buckets.setdefault(bucket, []).append(slot)
+
+        timestamps = []
+        series = {name: [] for name in fields}
+        for bucket in sorted(buckets):
+            members = buckets[bucket]
+            timestamps.append(first + bucket * width)
+            for name in fields:
+                column = self.columns[name]
+                values = [column[slot] for slot in members]
+                if aggregate == 'min':
+                    series[name].append(min(values))
+                elif aggregate == 'max':
+                    series[name].append(max(values))
+                elif aggregate == 'last':
+                    series[name].append(values[-1])
+                else:
+                    series[name].append(sum(values) / len(values))
+        return {'timestamps': timestamps, 'series': series, 'downsampled': True}
+
+class MetricHistory:
+    """A MetricRing backed by append-only segment files in a directory"""
+
+    def __init__(self, directory, capacity=10080, fields=None):
+        self.directory = directory
+        self.ring = MetricRing(capacity, fields)
+        self.record = struct.Struct('<d' + ''.join(self.ring.fields.values()))
+        self.segment = None      # name of the newest segment file seen
+        self.offset = 0          # bytes of that segment already in the ring
+        self.last_catch_up = 0.0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.seg'))
+
+    def load(self):
+        """Rebuild the ring from the newest segments on disk"""
+        with self.lock:
+            segments = self.segments()
+            needed, selected = self.ring.capacity, []
+            for name in reversed(segments):
+                selected.append(name)
+                needed -= os.path.getsize(os.path.join(self.directory, name)) // self.record.size
+                if needed <= 0:
+                    break
+            for name in reversed(selected):
+                self._read_segment(name, 0)
+        return self
+
+    def _read_segment(self, name, offset):
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        usable = len(data) - len(data) % self.record.size
+        names = list(self.ring.fields)
+        for (timestamp, *values) in self.record.iter_unpack(data[:usable]):
+            self.ring.append(timestamp, dict(zip(names, values)))
+        self.segment, self.offset = name, offset + usable
+
+    def catch_up(self, force=False):
+        """Pull in points another process appended since we last looked"""
+        now = time.time()
+        if not force and now - self.last_catch_up < CATCH_UP_INTERVAL:
+            return
+        self.last_catch_up = now
+        with self.lock:
+            self._catch_up_locked()
+
+    def _catch_up_locked(self):
+        for name in self.segments():
+            if self.segment is None or name > self.segment:
+                self._read_segment(name, 0)
+            elif name == self.segment:
+                if os.path.getsize(os.path.join(self.directory, name)) > self.offset:
+                    self._read_segment(name, self.offset)
+
+    def append(self, values, timestamp=None):
+        """Record one point in memory and on disk"""
+        timestamp = timestamp or time.time()
+        row = self.record.pack(timestamp, *(values.get(name) or 0 for name in self.ring.fields))
+        with self.lock:
+            # Another process may have been writing (e.g. before a leader change)
+            self._catch_up_locked()
+            if self.segment is None or self.offset >= SEGMENT_RECORDS * self.record.size:
+                self.segment, self.offset = f'{int(timestamp * 1000):015d}.seg', 0
+                self._prune()
+            with open(os.path.join(self.directory, self.segment), 'ab') as f:
+                f.write(row)
+            self.offset += len(row)
+            self.ring.append(timestamp, values)
+
+    def _prune(self):
+        for name in self.segments()[:-MAX_SEGMENTS]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def query(self, start=None, end=None, fields=None, max_points=None, aggregate='mean'):
+        with self.lock:
+            return self.ring.query(start, end, fields, max_points, aggregate)
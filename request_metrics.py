@@ -0,0 +1,231 @@
+"""
+Request-level metrics for the dashboard's WSGI app
+
+RequestMetrics wraps the WSGI app and records per route: a latency histogram,
+the time spent waiting on shared locks, the response size and the status.
+Code running under a request can charge time to named stages with
+record_stage(); slow requests are logged with that breakdown, sampled so that
+a burst of slow requests does not turn into a burst of log writes.
+
+The request being served is tracked in a thread-local, so stages recorded by
+background threads (the refresher) are not charged to any request.
+"""
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+# Any other method is recorded as 'other', so clients cannot mint new series
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'))
+
+local = threading.local()
+
+class RequestTrace:
+    """Route and per-stage time of the request being served on this thread"""
+    __slots__ = ('route', 'stages', 'lock_wait')
+
+    def __init__(self):
+        self.route = None
+        self.stages = {}
+        self.lock_wait = 0.0
+
+def record_stage(stage, seconds):
+    """Charge time to a stage of the current request, if this thread is serving one"""
+    trace = getattr(local, 'trace', None)
+    if trace is not None:
+        trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+
+def set_route(route):
+    """Label the current request with the route (URL rule) that matched it"""
+    trace = getattr(local, 'trace', None)
+    if trace is not None:
+        trace.route = route
+
+class TimedLock:
+    """A Lock that charges the time spent waiting for it to the current request
+
+    Uncontended acquisitions take the fast path and never read the clock.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        waited = time.perf_counter() - start
+        trace = getattr(local, 'trace', None)
+        if trace is not None:
+            trace.lock_wait += waited
+            trace.stages[f'wait:{self.name}'] = trace.stages.get(f'wait:{self.name}', 0.0) + waited
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def locked(self):
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class RequestMetrics:
+    """WSGI middleware feeding per-route request metrics into a MetricsRegistry"""
+
+    def __init__(self, app, registry, slow_seconds=1.0, slow_sample=0.1, slow_log=None):
+        self.app = app
+        self.slow_seconds = slow_seconds
+        self.slow_sample = slow_sample
+        self.slow_log = slow_log
+        self.log_lock = threading.Lock()
+        self.latency = registry.histogram(
+            'dashboard_http_request_seconds', 'Request latency by route, excluding event streams', ['route', 'method'])
+        self.lock_wait = registry.histogram(
+            'dashboard_http_lock_wait_seconds', 'Time requests spent waiting on the snapshot lock', ['route'])
+        self.response_bytes = registry.histogram(
+            'dashboard_http_response_bytes', 'Response body size by route', ['route'], buckets=SIZE_BUCKETS)
+        self.responses = registry.counter(
+            'dashboard_http_responses_total', 'Responses by route, method and status', ['route', 'method', 'status'])
+        self.slow_requests = registry.counter(
+            'dashboard_http_slow_requests_total', 'Requests slower than the slow-request threshold, logged or not', ['route'])
+        # Bound series per (route, method, status), so recording skips the label lookups
+        self.children = {}
+
+    def __call__(self, environ, start_response):
+        trace = local.trace = RequestTrace()
+        start = time.perf_counter()
+        response = {}
+
+        def capture(status, headers, exc_info=None):
+            response['status'] = status[:3]
+            for name, value in headers:
+                name = name.lower()
+                if name == 'content-type':
+                    response['streaming'] = value.startswith('text/event-stream')
+                elif name == 'content-length':
+                    response['length'] = value
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.app(environ, capture)
+        except Exception:
+            local.trace = None
+            self.record(trace.route or 'unmatched', environ.get('REQUEST_METHOD', ''), '500',
+                        time.perf_counter() - start, 0, trace, environ)
+            raise
+        length = response.get('length')
+        if length is not None and length.isdigit() and not response.get('streaming'):
+            # Body already built (Flask buffers everything but streams): record now and
+            # hand it to the server unwrapped
+            local.trace = None
+            self.record(trace.route or 'unmatched', environ.get('REQUEST_METHOD', ''), response['status'],
+                        time.perf_counter() - start, int(length), trace, environ)
+            return body
+        return ResponseIterator(self, body, environ, trace, start, response)
+
+    def series(self, route, method, status):
+        key = (route, method, status)
+        children = self.children.get(key)
+        if children is None:
+            children = self.children[key] = (
+                self.responses.labels(route=route, method=method, status=status),
+                self.latency.labels(route=route, method=method),
+                self.response_bytes.labels(route=route),
+                self.lock_wait.labels(route=route)
+            )
+        return children
+
+    def record(self, route, method, status, seconds, size, trace=None, environ=None, streaming=False):
+        """Record one finished request; also used for routes served outside the WSGI app"""
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        responses, latency, response_bytes, lock_wait = self.series(route, method, status)
+        responses.inc()
+        if streaming:
+            # An event stream's duration is how long the client stayed connected
+            return
+        latency.observe(seconds)
+        response_bytes.observe(size)
+        if trace is not None:
+            lock_wait.observe(trace.lock_wait)
+        if seconds >= self.slow_seconds:
+            self.slow_requests.inc(route=route)
+            if random.random() < self.slow_sample:
+                self.log_slow(route, method, status, seconds, size, trace, environ)
+
+    def log_slow(self, route, method, status, seconds, size, trace, environ):
+        stages = dict(trace.stages) if trace is not None else {}
+        entry = {
+            'time': datetime.now().isoformat(),
+            'method': method,
+            'path': (environ or {}).get('PATH_INFO'),
+            'query': (environ or {}).get('QUERY_STRING'),
+            'route': route,
+            'status': status,
+            'seconds': round(seconds, 4),
+            'bytes': size,
+            'stages': {name: round(value, 4) for name, value in stages.items()},
+            # Stage waits nest inside builds and refreshes, so this is a lower bound
+            'unaccounted': round(max(seconds - sum(stages.values()), 0.0), 4)
+        }
+        line = json.dumps(entry)
+        if not self.slow_log:
+            print(f"Slow request: {line}")
+            return
+        try:
+            with self.log_lock, open(self.slow_log, 'a') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Error writing slow request log: {e}")
+
+class ResponseIterator:
+    """Pass a WSGI response body through, finishing the request's metrics once it is sent
+
+    That is when the body is exhausted or closed, whichever comes first: some
+    servers (asgiref's WsgiToAsgi) never call close().
+    """
+
+    def __init__(self, metrics, body, environ, trace, start, response):
+        self.metrics = metrics
+        self.body = body
+        self.environ = environ
+        self.trace = trace
+        self.start = start
+        self.response = response
+        self.size = 0
+        self.finished = False
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+        self.finish()
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.finish()
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        local.trace = None
+        self.metrics.record(
+            self.trace.route or 'unmatched', self.environ.get('REQUEST_METHOD', ''), self.response.get('status', '500'),
+            time.perf_counter() - self.start, self.size, self.trace, self.environ,
+            streaming=self.response.get('streaming', False)
+        )
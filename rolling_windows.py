@@ -0,0 +1,273 @@
+"""
+Rolling-window aggregates of leads dialled and connected calls per client and bot
+
+The sheet only has cumulative counters, so every refresh turns the change since
+the previous refresh into an increment and drops it into time buckets. Each
+group keeps a 60 x 1 minute ring (the last hour) and a 168 x 1 hour ring (24h,
+7d and "same hour yesterday"), with running sums per window that are adjusted
+as buckets expire. Reading a window is therefore O(1) however much history
+has accumulated.
+
+On disk the state is a JSON file plus a journal of the counters that moved at
+each refresh; the file is only rewritten once the journal holds COMPACT_EVERY
+entries, so a refresh writes what changed rather than every ring.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+
+MEASURES = ('leads', 'calls')
+GROUPS = {'client': 'client_performance', 'bot': 'bot_performance'}
+COMPACT_EVERY = 60  # journal entries between full rewrites; an hour of minutely refreshes
+
+class BucketRing:
+    """Fixed number of time buckets with running sums over trailing spans"""
+
+    def __init__(self, width, size, spans):
+        self.width = width
+        self.size = size
+        self.spans = spans  # window name -> number of trailing buckets (<= size)
+        self.values = {measure: array('q', bytes(8 * size)) for measure in MEASURES}
+        self.sums = {span: dict.fromkeys(MEASURES, 0) for span in spans}
+        self.head = None    # id of the newest bucket
+
+    def bucket_id(self, timestamp):
+        return int(timestamp // self.width)
+
+    def advance(self, bucket):
+        """Move the newest bucket forward, expiring what falls out of each span"""
+        if self.head is None or bucket - self.head >= self.size:
+            for column in self.values.values():
+                for slot in range(self.size):
+                    column[slot] = 0
+            for sums in self.sums.values():
+                for measure in MEASURES:
+                    sums[measure] = 0
+            self.head = bucket
+            return
+
+        for current in range(self.head + 1, bucket + 1):
+            for span, count in self.spans.items():
+                leaving = (current - count) % self.size
+                for measure in MEASURES:
+                    self.sums[span][measure] -= self.values[measure][leaving]
+            slot = current % self.size
+            for measure in MEASURES:
+                self.values[measure][slot] = 0
+        self.head = max(self.head, bucket)
+
+    def add(self, timestamp, amounts):
+        bucket = self.bucket_id(timestamp)
+        self.advance(bucket)
+        if bucket <= self.head - self.size:
+            return
+        slot = bucket % self.size
+        for measure in MEASURES:
+            amount = amounts.get(measure, 0)
+            self.values[measure][slot] += amount
+            for span, count in self.spans.items():
+                if bucket > self.head - count:
+                    self.sums[span][measure] += amount
+
+    def bucket(self, bucket):
+        """Values of one bucket, or zeros if it is no longer (or not yet) held"""
+        if self.head is None or not self.head - self.size < bucket <= self.head:
+            return dict.fromkeys(MEASURES, 0)
+        slot = bucket % self.size
+        return {measure: self.values[measure][slot] for measure in MEASURES}
+
+    def to_dict(self):
+        return {'head': self.head, 'values': {measure: list(column) for measure, column in self.values.items()},
+                'sums': self.sums}
+
+    def load_dict(self, state):
+        self.head = state['head']
+        for measure in MEASURES:
+            self.values[measure] = array('q', state['values'][measure])
+        self.sums = state['sums']
+
+class GroupWindows:
+    """Minute and hour rings for one client or bot"""
+
+    def __init__(self):
+        self.minutes = BucketRing(60, 60, {'1h': 60})
+        self.hours = BucketRing(3600, 168, {'24h': 24, '7d': 168})
+
+    def add(self, timestamp, amounts):
+        self.minutes.add(timestamp, amounts)
+        self.hours.add(timestamp, amounts)
+
+    def windows(self, now):
+        self.minutes.advance(self.minutes.bucket_id(now))
+        self.hours.advance(self.hours.bucket_id(now))
+        current_hour = self.hours.bucket_id(now)
+        return {
+            '1h': with_success_rate(self.minutes.sums['1h']),
+            '24h': with_success_rate(self.hours.sums['24h']),
+            '7d': with_success_rate(self.hours.sums['7d']),
+            'this_hour': with_success_rate(self.hours.bucket(current_hour)),
+            'same_hour_yesterday': with_success_rate(self.hours.bucket(current_hour - 24))
+        }
+
+def with_success_rate(totals):
+    leads, calls = totals['leads'], totals['calls']
+    return {'leads': leads, 'calls': calls, 'success_rate': round(calls / leads * 100, 2) if leads > 0 else 0}
+
+class RollingAggregates:
+    """Per-group rolling windows fed with counter increments between refreshes"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.log' if path else None
+        self.groups = {group: {} for group in GROUPS}    # group -> name -> GroupWindows
+        self.baseline = {group: {} for group in GROUPS}  # group -> name -> cumulative counters last seen
+        self.updated_at = None
+        self.loaded_mtime = None
+        self.journal_offset = 0
+        self.journal_entries = 0
+        self.lock = threading.Lock()
+
+    def update(self, metrics, timestamp=None):
+        """Turn the cumulative counters in a snapshot's metrics into increments"""
+        timestamp = timestamp or time.time()
+        counters = {
+            group: {name: {measure: performance.get(measure, 0) for measure in MEASURES}
+                    for name, performance in (metrics.get(metrics_key) or {}).items()}
+            for group, metrics_key in GROUPS.items()
+        }
+        with self.lock:
+            changed = self._apply(counters, timestamp)
+            if self.loaded_mtime is None or self.journal_entries >= COMPACT_EVERY:
+                self._save()
+            else:
+                self._append_journal(changed, timestamp)
+
+    def _apply(self, counters, timestamp):
+        """Diff counters against the baseline; returns the members whose counters moved"""
+        first = self.updated_at is None
+        changed = {}
+        for group, members in counters.items():
+            baseline = self.baseline[group]
+            for name, current in members.items():
+                previous = baseline.get(name)
+                if previous == current:
+                    continue
+                baseline[name] = current
+                changed.setdefault(group, {})[name] = current
+                if first:
+                    # Nothing to diff against yet
+                    continue
+                amounts = {}
+                for measure in MEASURES:
+                    change = current[measure] - (previous or {}).get(measure, 0)
+                    # A counter that went down was reset in the sheet; count from zero
+                    amounts[measure] = change if change >= 0 else current[measure]
+                if any(amounts.values()):
+                    windows = self.groups[group].get(name)
+                    if windows is None:
+                        windows = self.groups[group][name] = GroupWindows()
+                    windows.add(timestamp, amounts)
+        self.updated_at = timestamp
+        return changed
+
+    def windows(self, group, name=None, now=None, sort=None, limit=100):
+        """Window totals for one group member, or the top members by a window measure"""
+        now = now or time.time()
+        with self.lock:
+            if name is not None:
+                windows = self.groups[group].get(name)
+                return {name: windows.windows(now)} if windows else {}
+            rows = {member: windows.windows(now) for member, windows in self.groups[group].items()}
+
+        if sort:
+            window, _, measure = sort.partition('.')
+            rows = dict(sorted(rows.items(), key=lambda item: item[1].get(window, {}).get(measure, 0), reverse=True))
+        return dict(list(rows.items())[:limit])
+
+    def _save(self):
+        if not self.path:
+            return
+        state = {
+            'updated_at': self.updated_at,
+            'baseline': self.baseline,
+            'groups': {
+                group: {name: {'minutes': windows.minutes.to_dict(), 'hours': windows.hours.to_dict()}
+                        for name, windows in members.items()}
+                for group, members in self.groups.items()
+            }
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        # Everything journaled so far is in the file now
+        open(self.journal_path, 'w').close()
+        self.loaded_mtime = os.path.getmtime(self.path)
+        self.journal_offset = 0
+        self.journal_entries = 0
+
+    def _append_journal(self, changed, timestamp):
+        line = json.dumps({'t': timestamp, 'counters': changed}, separators=(',', ':')) + '\n'
+        with open(self.journal_path, 'ab') as f:
+            f.write(line.encode('utf-8'))
+            self.journal_offset = f.tell()
+        self.journal_entries += 1
+
+    def _replay_journal(self):
+        """Apply journal entries newer than the loaded state
+        
+        Entries at or before updated_at are skipped, so replaying a journal that was
+        already (partly) applied is harmless.
+        """
+        try:
+            size = os.path.getsize(self.journal_path)
+        except OSError:
+            return
+        if size < self.journal_offset:
+            # Truncated by a rewrite we have not loaded yet; the timestamps keep this safe
+            self.journal_offset = 0
+        if size == self.journal_offset:
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self.journal_offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Still being written
+                    break
+                self.journal_offset += len(line)
+                self.journal_entries += 1
+                entry = json.loads(line)
+                if self.updated_at is None or entry['t'] > self.updated_at:
+                    self._apply(entry['counters'], entry['t'])
+
+    def reload(self):
+        """Load the persisted state if another process (or a previous run) wrote a newer one"""
+        if not self.path:
+            return self
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return self
+        if mtime == self.loaded_mtime:
+            with self.lock:
+                self._replay_journal()
+            return self
+        with open(self.path) as f:
+            state = json.load(f)
+        with self.lock:
+            self.updated_at = state['updated_at']
+            self.baseline = state['baseline']
+            self.groups = {group: {} for group in GROUPS}
+            for group, members in state['groups'].items():
+                for name, rings in members.items():
+                    windows = self.groups[group][name] = GroupWindows()
+                    windows.minutes.load_dict(rings['minutes'])
+                    windows.hours.load_dict(rings['hours'])
+            self.loaded_mtime = mtime
+            self.journal_offset = 0
+            self.journal_entries = 0
+            self._replay_journal()
+        return self
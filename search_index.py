@@ -0,0 +1,200 @@
+"""
+Inverted search index over campaign rows
+Supports exact, prefix and typo-tolerant (one edit) token matching
+"""
+import re
+from bisect import bisect_left, insort
+from heapq import nlargest
+from itertools import islice
+
+SEARCH_FIELDS = ['Client', 'Bot Name', ' reporting CM', 'Monitoring']
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+MIN_FUZZY_LENGTH = 4
+
+# Match quality weights
+EXACT_SCORE = 3
+PREFIX_SCORE = 2
+FUZZY_SCORE = 1
+
+def tokenize(text):
+    """Split text into lowercase alphanumeric tokens"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+def single_deletes(token):
+    """All variants of a token with one character removed"""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one insertion, deletion, substitution or transposition"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    for i in range(len(longer)):
+        if longer[:i] + longer[i + 1:] == shorter:
+            return True
+    return False
+
+class CampaignSearchIndex:
+    """Token -> row key postings with a sorted vocabulary and a deletion index for typos"""
+
+    def __init__(self, fields=None):
+        self.fields = fields or SEARCH_FIELDS
+        self.postings = {}      # token -> set of row keys
+        self.vocabulary = []    # sorted tokens, for prefix lookups
+        self.deletes = {}       # one-deletion variant -> set of tokens
+        self.documents = {}     # row key -> row
+        self.doc_tokens = {}    # row key -> set of tokens
+
+    def row_tokens(self, row):
+        """Tokens for the searchable fields of a row"""
+        tokens = set()
+        for field in self.fields:
+            tokens.update(tokenize(row.get(field)))
+        return tokens
+
+    def _add_token(self, token, key):
+        keys = self.postings.get(token)
+        if keys is None:
+            keys = self.postings[token] = set()
+            insort(self.vocabulary, token)
+            for variant in single_deletes(token):
+                self.deletes.setdefault(variant, set()).add(token)
+        keys.add(key)
+
+    def _remove_token(self, token, key):
+        keys = self.postings.get(token)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+            for variant in single_deletes(token):
+                tokens = self.deletes.get(variant)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.deletes[variant]
+
+    def add(self, key, row):
+        """Index (or re-index) a single row"""
+        if key in self.documents:
+            self.remove(key)
+        tokens = self.row_tokens(row)
+        for token in tokens:
+            self._add_token(token, key)
+        self.documents[key] = row
+        self.doc_tokens[key] = tokens
+
+    def remove(self, key):
+        """Drop a row from the index"""
+        for token in self.doc_tokens.pop(key, ()):
+            self._remove_token(token, key)
+        self.documents.pop(key, None)
+
+    def build(self, keys, rows):
+        """Index a full snapshot"""
+        for key, row in zip(keys, rows):
+            self.add(key, row)
+        return self
+
+    def apply_changes(self, upserts, removed):
+        """Incrementally apply changed and removed rows"""
+        for key in removed:
+            self.remove(key)
+        for key, row in upserts.items():
+            self.add(key, row)
+
+    def _prefix_tokens(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _fuzzy_tokens(self, token):
+        candidates = set(self.deletes.get(token, ()))
+        for variant in single_deletes(token):
+            if variant in self.postings:
+                candidates.add(variant)
+            candidates.update(self.deletes.get(variant, ()))
+        return {candidate for candidate in candidates if within_one_edit(token, candidate)}
+
+    def match_token(self, token, prefix=True, fuzzy=True):
+        """Vocabulary tokens matching one query token, with their match weight"""
+        weights = {}
+
+        if prefix:
+            for candidate in self._prefix_tokens(token):
+                weights[candidate] = EXACT_SCORE if candidate == token else PREFIX_SCORE
+        elif token in self.postings:
+            weights[token] = EXACT_SCORE
+
+        if fuzzy and len(token) >= MIN_FUZZY_LENGTH:
+            for candidate in self._fuzzy_tokens(token):
+                weights.setdefault(candidate, FUZZY_SCORE)
+
+        return weights
+
+    def _top_single(self, weights, limit):
+        # With one query token a row scores its best candidate's weight,
+        # so walk candidates best-first and stop once the page is full
+        results = []
+        seen = set()
+        for candidate, weight in sorted(weights.items(), key=lambda item: -item[1]):
+            for key in self.postings[candidate]:
+                if key not in seen:
+                    seen.add(key)
+                    results.append((key, self.documents[key], weight))
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def search(self, query, limit=20, prefix=True, fuzzy=True):
+        """Return (key, row, score) for rows matching every query token, best first"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        token_weights = [self.match_token(token, prefix=prefix, fuzzy=fuzzy) for token in tokens]
+        if not all(token_weights):
+            return []
+        if len(token_weights) == 1:
+            return self._top_single(token_weights[0], limit)
+
+        # Rows where every token matches exactly already carry the best possible score
+        if all(token in weights for token, weights in zip(tokens, token_weights)):
+            exact_sets = sorted((self.postings[token] for token in tokens), key=len)
+            exact = exact_sets[0].intersection(*exact_sets[1:])
+            if len(exact) >= limit:
+                best = EXACT_SCORE * len(tokens)
+                return [(key, self.documents[key], best) for key in islice(exact, limit)]
+
+        # Intersect the per-token row sets smallest first, then score only the survivors
+        key_sets = []
+        for weights in token_weights:
+            if len(weights) == 1:
+                key_sets.append(self.postings[next(iter(weights))])
+            else:
+                key_sets.append(set().union(*(self.postings[candidate] for candidate in weights)))
+        key_sets.sort(key=len)
+        matched = key_sets[0].intersection(*key_sets[1:])
+
+        scored = []
+        for key in matched:
+            row_tokens = self.doc_tokens[key]
+            score = 0
+            for weights in token_weights:
+                score += max(weights.get(token, 0) for token in row_tokens)
+            scored.append((score, key))
+
+        return [(key, self.documents[key], score) for score, key in nlargest(limit, scored)]
@@ -0,0 +1,154 @@
+"""
+Memory-mapped snapshot files shared between worker processes
+
+One file per sheet in a shared directory (ideally tmpfs such as /dev/shm). The
+refreshing process writes each new /api/data body into a fresh file and renames
+it into place; every worker keeps the current file mapped and only has to look
+at the fixed-size header to notice a newer version.
+
+File layout:
+    magic 8s | version Q | payload length Q | published_at d | last_viewed d |
+    superseded B | padding | sheet key 128s | ... | payload (at HEADER_SIZE)
+"""
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+MAGIC = b'CDSNAP01'
+HEADER_FORMAT = '<8sQQddB7x128s'
+HEADER_SIZE = 256
+LAST_VIEWED_OFFSET = struct.calcsize('<8sQQd')
+SUPERSEDED_OFFSET = struct.calcsize('<8sQQdd')
+VIEW_WRITE_INTERVAL = 1.0
+
+def sheet_slug(key):
+    """Filesystem-safe name for a sheet key"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key)
+
+def snapshot_filename(key):
+    """File name for a sheet key"""
+    return sheet_slug(key) + '.snap'
+
+class MappedSnapshot:
+    """Read-only view of one snapshot file, mapped once and reused until superseded"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r+b') as f:
+            self.map = mmap.mmap(f.fileno(), 0)
+        magic, self.version, self.length, self.published_at, _, _, key = struct.unpack_from(HEADER_FORMAT, self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f'Not a snapshot file: {path}')
+        self.key = key.rstrip(b'\0').decode('utf-8')
+        self.last_view_write = 0.0
+
+    @property
+    def superseded(self):
+        return self.map[SUPERSEDED_OFFSET] == 1
+
+    @property
+    def last_viewed(self):
+        return struct.unpack_from('<d', self.map, LAST_VIEWED_OFFSET)[0]
+
+    def payload(self):
+        """Zero-copy view of the payload"""
+        return memoryview(self.map)[HEADER_SIZE:HEADER_SIZE + self.length]
+
+    def touch(self):
+        """Record a view in the shared header (throttled, no syscalls)"""
+        now = time.time()
+        if now - self.last_view_write >= VIEW_WRITE_INTERVAL:
+            struct.pack_into('<d', self.map, LAST_VIEWED_OFFSET, now)
+            self.last_view_write = now
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            # A payload view is still alive; the mapping goes away with it
+            pass
+
+class SharedSnapshotStore:
+    """Publishes and maps snapshot files in a directory shared by all workers"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.mapped = {}  # key -> MappedSnapshot
+        self.lock = threading.Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, snapshot_filename(key))
+
+    def current(self, key):
+        """The mapped snapshot for a key, remapping when a newer file was renamed in"""
+        snapshot = self.mapped.get(key)
+        if snapshot is not None and not snapshot.superseded:
+            return snapshot
+
+        with self.lock:
+            snapshot = self.mapped.get(key)
+            if snapshot is not None and not snapshot.superseded:
+                return snapshot
+            try:
+                fresh = MappedSnapshot(self.path_for(key))
+            except (OSError, ValueError):
+                return snapshot
+            # The old mapping is released once no reader holds it any more
+            self.mapped[key] = fresh
+            return fresh
+
+    def current_version(self, key):
+        snapshot = self.current(key)
+        return snapshot.version if snapshot else 0
+
+    def publish(self, key, version, payload, published_at=None):
+        """Write a new snapshot file and atomically swap it in"""
+        path = self.path_for(key)
+        previous = self.current(key)
+        published_at = published_at or time.time()
+        # A brand new sheet was published because someone asked for it
+        last_viewed = previous.last_viewed if previous else published_at
+        key_bytes = key.encode('utf-8')[:128]
+
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            header = struct.pack(
+                HEADER_FORMAT, MAGIC, version, len(payload),
+                published_at, last_viewed, 0, key_bytes
+            )
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.write(payload)
+        os.replace(temp_path, path)
+
+        # Tell every process still mapping the old file to remap
+        if previous is not None:
+            previous.map[SUPERSEDED_OFFSET] = 1
+        return self.current(key)
+
+    def _scan(self):
+        """Map every snapshot file in turn; each is closed once the caller moves on"""
+        for name in os.listdir(self.directory):
+            if not name.endswith('.snap'):
+                continue
+            try:
+                snapshot = MappedSnapshot(os.path.join(self.directory, name))
+            except (OSError, ValueError):
+                continue
+            try:
+                yield snapshot
+            finally:
+                snapshot.close()
+
+    def viewed_keys(self, viewer_ttl):
+        """Keys of snapshot files any worker has viewed within viewer_ttl seconds"""
+        cutoff = time.time() - viewer_ttl
+        return [snapshot.key for snapshot in self._scan() if snapshot.last_viewed >= cutoff]
+
+    def latest_version(self):
+        """Highest version published for any sheet"""
+        return max((snapshot.version for snapshot in self._scan()), default=0)
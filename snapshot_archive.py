@@ -0,0 +1,246 @@
+"""
+Content-addressed archive of past snapshots for time-travel reads
+
+Rows are stored once per distinct content (sha256 of their canonical JSON) in
+append-only pack files. A snapshot is a small "tree" object listing its row
+hashes, row keys and the remaining metrics/analytics. Identical snapshots share
+a tree, and consecutive snapshots share every unchanged row. A timeline log maps
+fetch times to trees, so any retained moment can be rebuilt without full copies.
+
+Layout:
+    packs/<start>.pack    concatenated deflated row objects
+    rows.idx              "<hash> <pack> <offset> <length>" per stored row
+    trees/<hash>.json.z   deflated tree objects
+    timeline.log          {"t", "version", "last_update", "last_updated", "tree"} per archived snapshot
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict
+
+ROW_CACHE_SIZE = 50000
+PACK_MAX_BYTES = 64 * 1024 * 1024
+GC_INTERVAL = 6 * 3600
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+class SnapshotArchive:
+    """Row-deduplicating snapshot archive with a timeline index"""
+
+    def __init__(self, directory, retention_seconds=30 * 86400):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.rows = {}          # row hash -> (pack, offset, length)
+        self.rows_offset = 0    # bytes of rows.idx already loaded
+        self.timeline = []      # entries sorted by time
+        self.timeline_times = []
+        self.timeline_offset = 0
+        self.row_cache = OrderedDict()
+        self.last_gc = time.time()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'packs'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'trees'), exist_ok=True)
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    # -- loading and tailing ----------------------------------------------------
+
+    def refresh(self):
+        """Pick up rows and timeline entries appended by another process"""
+        with self.lock:
+            self._refresh_locked()
+        return self
+
+    def _tail(self, name, offset):
+        try:
+            with open(self.path(name), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return [], offset
+        # Only consume complete lines
+        usable = data.rfind(b'\n') + 1
+        return data[:usable].decode('utf-8').splitlines(), offset + usable
+
+    def _refresh_locked(self):
+        # Garbage collection rewrites both logs; start over when they shrank under us
+        try:
+            rewritten = (os.path.getsize(self.path('rows.idx')) < self.rows_offset
+                         or os.path.getsize(self.path('timeline.log')) < self.timeline_offset)
+        except OSError:
+            rewritten = False
+        if rewritten:
+            self.rows, self.rows_offset = {}, 0
+            self.timeline, self.timeline_times, self.timeline_offset = [], [], 0
+
+        lines, self.rows_offset = self._tail('rows.idx', self.rows_offset)
+        for line in lines:
+            row_hash, pack, offset, length = line.split(' ')
+            self.rows[row_hash] = (pack, int(offset), int(length))
+
+        lines, self.timeline_offset = self._tail('timeline.log', self.timeline_offset)
+        for line in lines:
+            entry = json.loads(line)
+            self.timeline.append(entry)
+            self.timeline_times.append(entry['t'])
+
+    # -- writing ----------------------------------------------------------------
+
+    def _current_pack(self):
+        packs = sorted(name for name in os.listdir(self.path('packs')) if name.endswith('.pack'))
+        if packs and os.path.getsize(self.path('packs', packs[-1])) < PACK_MAX_BYTES:
+            return packs[-1]
+        return f'{int(time.time() * 1000):015d}.pack'
+
+    def add(self, snapshot, version, last_update=None, timestamp=None):
+        """Archive a processed snapshot; returns its tree hash"""
+        timestamp = timestamp or time.time()
+        with self.lock:
+            self._refresh_locked()
+
+            new_rows = []
+            row_hashes = []
+            for row in snapshot['raw_data']:
+                data = canonical(row)
+                row_hash = content_hash(data)
+                row_hashes.append(row_hash)
+                if row_hash not in self.rows:
+                    self.rows[row_hash] = None  # claimed; written below
+                    new_rows.append((row_hash, zlib.compress(data)))
+
+            if new_rows:
+                pack = self._current_pack()
+                with open(self.path('packs', pack), 'ab') as f:
+                    offset = f.tell()
+                    index_lines = []
+                    for row_hash, blob in new_rows:
+                        f.write(blob)
+                        self.rows[row_hash] = (pack, offset, len(blob))
+                        index_lines.append(f'{row_hash} {pack} {offset} {len(blob)}\n')
+                        offset += len(blob)
+                # Rows must be on disk before the index points at them
+                with open(self.path('rows.idx'), 'a') as f:
+                    f.write(''.join(index_lines))
+                self.rows_offset = os.path.getsize(self.path('rows.idx'))
+
+            # The fetch time inside metrics changes every refresh; keep it out of the content hash
+            metrics = dict(snapshot.get('metrics') or {})
+            last_updated = metrics.pop('last_updated', None)
+            meta = {name: value for name, value in snapshot.items() if name not in ('raw_data', 'live_campaigns', 'row_keys', 'metrics')}
+            meta['metrics'] = metrics
+            live_hashes = [content_hash(canonical(row)) for row in snapshot.get('live_campaigns') or []]
+            tree = canonical({'rows': row_hashes, 'row_keys': snapshot.get('row_keys'), 'live': live_hashes, 'meta': meta})
+            tree_hash = content_hash(tree)
+            tree_path = self.path('trees', f'{tree_hash}.json.z')
+            if not os.path.exists(tree_path):
+                with open(tree_path + '.tmp', 'wb') as f:
+                    f.write(zlib.compress(tree))
+                os.replace(tree_path + '.tmp', tree_path)
+
+            # An unchanged snapshot adds no objects; the timeline still records that it was seen
+            entry = {
+                't': timestamp,
+                'version': version,
+                'last_update': last_update.isoformat() if last_update else None,
+                'last_updated': last_updated,
+                'tree': tree_hash
+            }
+            with open(self.path('timeline.log'), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            self.timeline_offset = os.path.getsize(self.path('timeline.log'))
+            self.timeline.append(entry)
+            self.timeline_times.append(timestamp)
+
+            if timestamp - self.last_gc > GC_INTERVAL:
+                self._collect_garbage(timestamp)
+            return tree_hash
+
+    # -- reading ----------------------------------------------------------------
+
+    def entry_at(self, timestamp):
+        """The newest archived snapshot taken at or before timestamp"""
+        with self.lock:
+            self._refresh_locked()
+            position = bisect_right(self.timeline_times, timestamp)
+            return self.timeline[position - 1] if position else None
+
+    def _row(self, row_hash):
+        row = self.row_cache.get(row_hash)
+        if row is not None:
+            self.row_cache.move_to_end(row_hash)
+            return row
+        pack, offset, length = self.rows[row_hash]
+        with open(self.path('packs', pack), 'rb') as f:
+            f.seek(offset)
+            row = json.loads(zlib.decompress(f.read(length)))
+        self.row_cache[row_hash] = row
+        if len(self.row_cache) > ROW_CACHE_SIZE:
+            self.row_cache.popitem(last=False)
+        return row
+
+    def load(self, entry):
+        """Rebuild the processed snapshot an archive entry refers to"""
+        with open(self.path('trees', f"{entry['tree']}.json.z"), 'rb') as f:
+            tree = json.loads(zlib.decompress(f.read()))
+        with self.lock:
+            rows = [self._row(row_hash) for row_hash in tree['rows']]
+            live = [self._row(row_hash) for row_hash in tree['live']]
+
+        snapshot = dict(tree['meta'])
+        snapshot['metrics'] = dict(snapshot['metrics'], last_updated=entry['last_updated'])
+        snapshot['raw_data'] = rows
+        snapshot['live_campaigns'] = live
+        snapshot['row_keys'] = tree['row_keys']
+        return snapshot
+
+    # -- retention --------------------------------------------------------------
+
+    def _collect_garbage(self, now):
+        """Drop timeline entries past retention and the trees, rows and packs only they used"""
+        self.last_gc = now
+        cutoff = now - self.retention_seconds
+        keep = [entry for entry in self.timeline if entry['t'] >= cutoff]
+        if len(keep) == len(self.timeline):
+            return
+
+        live_rows = set()
+        live_trees = {entry['tree'] for entry in keep}
+        for tree_hash in live_trees:
+            with open(self.path('trees', f'{tree_hash}.json.z'), 'rb') as f:
+                tree = json.loads(zlib.decompress(f.read()))
+            live_rows.update(tree['rows'])
+
+        with open(self.path('timeline.log.tmp'), 'w') as f:
+            f.write(''.join(json.dumps(entry) + '\n' for entry in keep))
+        os.replace(self.path('timeline.log.tmp'), self.path('timeline.log'))
+
+        for name in os.listdir(self.path('trees')):
+            if name.endswith('.json.z') and name[:-len('.json.z')] not in live_trees:
+                os.remove(self.path('trees', name))
+
+        # Packs are only removed once nothing in them is referenced any more
+        rows = {row_hash: location for row_hash, location in self.rows.items() if row_hash in live_rows}
+        used_packs = {location[0] for location in rows.values()}
+        for name in os.listdir(self.path('packs')):
+            if name.endswith('.pack') and name not in used_packs:
+                os.remove(self.path('packs', name))
+        rows = {row_hash: location for row_hash, location in self.rows.items() if location[0] in used_packs}
+
+        with open(self.path('rows.idx.tmp'), 'w') as f:
+            f.write(''.join(f'{row_hash} {pack} {offset} {length}\n' for row_hash, (pack, offset, length) in rows.items()))
+        os.replace(self.path('rows.idx.tmp'), self.path('rows.idx'))
+
+        self.rows = rows
+        self.rows_offset = os.path.getsize(self.path('rows.idx'))
+        self.timeline = keep
+        self.timeline_times = [entry['t'] for entry in keep]
+        self.timeline_offset = os.path.getsize(self.path('timeline.log'))
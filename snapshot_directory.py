@@ -0,0 +1,111 @@
+"""
+Versioned snapshot objects in a shared directory (an object-store stand-in)
+
+The ingest node writes every snapshot as an immutable object and then swaps a
+small per-sheet manifest to point at it; API nodes poll the manifests and load
+objects they have not seen. API nodes leave interest markers so the ingest node
+knows which sheets are being viewed.
+
+Layout:
+    sheets/<sheet>/<version>.json   /api/data body of one snapshot version
+    sheets/<sheet>/manifest.json    {"key", "version", "object", "published_at", "bytes"}
+    interest/<sheet>.json           {"key", "viewed_at"}
+"""
+import json
+import os
+import time
+
+from shared_snapshot import sheet_slug
+
+INTEREST_WRITE_INTERVAL = 60
+
+def write_atomic(path, data):
+    """Write a whole object so readers see either the old or the new contents"""
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def read_json(path):
+    try:
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+class SnapshotDirectory:
+    """Publishes and loads versioned snapshots under a shared root directory"""
+
+    def __init__(self, root, retain=5):
+        self.root = root
+        self.retain = retain
+        self.interest_written = {}  # key -> time of our last interest marker
+        os.makedirs(os.path.join(root, 'sheets'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'interest'), exist_ok=True)
+
+    def sheet_dir(self, key):
+        return os.path.join(self.root, 'sheets', sheet_slug(key))
+
+    def publish(self, key, version, body, published_at=None):
+        """Write a snapshot object, then point the sheet's manifest at it"""
+        directory = self.sheet_dir(key)
+        os.makedirs(directory, exist_ok=True)
+        name = f'{version:012d}.json'
+        write_atomic(os.path.join(directory, name), body)
+        manifest = {
+            'key': key,
+            'version': version,
+            'object': name,
+            'published_at': published_at or time.time(),
+            'bytes': len(body)
+        }
+        write_atomic(os.path.join(directory, 'manifest.json'), json.dumps(manifest).encode('utf-8'))
+        self.prune(directory)
+        return manifest
+
+    def prune(self, directory):
+        """Keep the newest few objects so readers holding an older manifest can still load"""
+        objects = sorted(name for name in os.listdir(directory) if name[:1].isdigit() and name.endswith('.json'))
+        for name in objects[:-self.retain]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def manifest(self, key):
+        """The sheet's latest manifest, or None"""
+        return read_json(os.path.join(self.sheet_dir(key), 'manifest.json'))
+
+    def latest_version(self, key):
+        manifest = self.manifest(key)
+        return manifest['version'] if manifest else 0
+
+    def load(self, key, manifest):
+        """Bytes of the object a manifest points at, or None if it was pruned meanwhile"""
+        try:
+            with open(os.path.join(self.sheet_dir(key), manifest['object']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def register_interest(self, key):
+        """Tell the ingest node this sheet is being viewed (written at most once a minute)"""
+        now = time.time()
+        if now - self.interest_written.get(key, 0) < INTEREST_WRITE_INTERVAL:
+            return
+        self.interest_written[key] = now
+        path = os.path.join(self.root, 'interest', sheet_slug(key) + '.json')
+        write_atomic(path, json.dumps({'key': key, 'viewed_at': now}).encode('utf-8'))
+
+    def interested_keys(self, viewer_ttl):
+        """Keys any API node has viewed within viewer_ttl seconds"""
+        cutoff = time.time() - viewer_ttl
+        directory = os.path.join(self.root, 'interest')
+        keys = []
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            marker = read_json(os.path.join(directory, name))
+            if marker and marker.get('viewed_at', 0) >= cutoff:
+                keys.append(marker['key'])
+        return keys
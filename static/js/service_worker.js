@@ -0,0 +1,93 @@
+// Service worker for the comprehensive dashboard.
+// Serves our static scripts and the CDN libraries (Chart.js, axios, Bootstrap,
+// Font Awesome) from cache, so a repeat visit only waits on the page itself;
+// the page falls back to its cached copy when offline. API responses are not
+// cached here: the dashboard worker keeps the last snapshot in IndexedDB and
+// revalidates it itself.
+
+const CACHE = 'dashboard-shell-v2';
+const SHELL = ['/', '/static/js/dashboard_worker.js', '/static/js/tab_leader.js'];
+const CDN_HOSTS = ['cdn.jsdelivr.net', 'cdnjs.cloudflare.com'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then(cache => cache.addAll(SHELL))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(names.filter(name => name !== CACHE).map(name => caches.delete(name))))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin === self.location.origin) {
+        if (request.mode === 'navigate' && url.pathname === '/') {
+            // The page inlines the current KPIs, so it is only served from cache when offline
+            event.respondWith(networkFirst(event, '/'));
+        } else if (url.pathname.startsWith('/static/')) {
+            event.respondWith(staleWhileRevalidate(event, request));
+        }
+    } else if (CDN_HOSTS.includes(url.hostname)) {
+        // Libraries only change when we bump CACHE
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+async function staleWhileRevalidate(event, key) {
+    const cache = await caches.open(CACHE);
+    const cached = await cache.match(key, { ignoreSearch: true });
+    const network = fetch(event.request).then(response => {
+        if (response.ok) {
+            cache.put(key, response.clone());
+        }
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(network.catch(() => undefined));
+        return cached;
+    }
+    return network;
+}
+
+async function networkFirst(event, key) {
+    const cache = await caches.open(CACHE);
+    try {
+        const response = await fetch(event.request);
+        if (response.ok) {
+            event.waitUntil(cache.put(key, response.clone()));
+        }
+        return response;
+    } catch (error) {
+        const cached = await cache.match(key, { ignoreSearch: true });
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function cacheFirst(request) {
+    const cache = await caches.open(CACHE);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    // The page loads these with crossorigin, so errors are visible instead of opaque
+    if (response.ok) {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
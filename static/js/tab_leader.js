@@ -0,0 +1,132 @@
+// Leader election between the dashboard tabs of one browser.
+// Visible tabs showing the same sheet share a BroadcastChannel. The leader sends
+// a heartbeat; when it stops (the tab was closed, hidden or frozen) the other
+// visible tabs claim the role, and the lower id wins if two claim at once. Only
+// the leader talks to the server and relays what it receives to the others.
+// Hidden tabs take no part until they are shown again.
+
+const TAB_HEARTBEAT_MS = 2000;
+const TAB_LEADER_TIMEOUT_MS = 5000;
+const TAB_CLAIM_DELAY_MS = 300;
+
+class TabLeader {
+    // handlers: onElected(), onDeposed(), onMessage(message), state() -> extra heartbeat fields
+    constructor(name, handlers) {
+        this.name = name;
+        this.handlers = handlers;
+        this.id = Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+        this.active = false;
+        this.isLeader = false;
+        this.leader = null;     // last heartbeat heard from another tab
+        this.claimTimer = null;
+        this.heartbeatTimer = null;
+        // Without BroadcastChannel every visible tab leads itself
+        this.channel = window.BroadcastChannel ? new BroadcastChannel(name) : null;
+        if (this.channel) {
+            this.channel.onmessage = event => this.receive(event.data);
+        }
+    }
+
+    // Take part in the election (the tab became visible)
+    resume() {
+        if (this.active) {
+            return;
+        }
+        this.active = true;
+        if (!this.channel) {
+            this.elect();
+            return;
+        }
+        // A current leader answers with a heartbeat before the claim fires; tabs opened
+        // together claim at staggered times
+        this.post({ type: 'hello' });
+        this.scheduleClaim(TAB_CLAIM_DELAY_MS * (1 + Math.random()));
+    }
+
+    // Stop taking part (the tab was hidden), handing the role to another tab
+    pause() {
+        if (!this.active) {
+            return;
+        }
+        this.active = false;
+        clearTimeout(this.claimTimer);
+        if (this.isLeader) {
+            this.post({ type: 'resign', id: this.id });
+            this.depose();
+        }
+    }
+
+    close() {
+        this.pause();
+        if (this.channel) {
+            this.channel.close();
+        }
+    }
+
+    post(message) {
+        if (this.channel) {
+            this.channel.postMessage(message);
+        }
+    }
+
+    heartbeat() {
+        const state = this.handlers.state ? this.handlers.state() : {};
+        this.post(Object.assign({ type: 'heartbeat', id: this.id }, state));
+    }
+
+    scheduleClaim(delay) {
+        clearTimeout(this.claimTimer);
+        this.claimTimer = setTimeout(() => this.elect(), delay);
+    }
+
+    elect() {
+        if (this.isLeader || !this.active) {
+            return;
+        }
+        this.isLeader = true;
+        this.leader = null;
+        if (this.channel) {
+            this.heartbeat();
+            this.heartbeatTimer = setInterval(() => this.heartbeat(), TAB_HEARTBEAT_MS);
+        }
+        this.handlers.onElected();
+    }
+
+    depose() {
+        this.isLeader = false;
+        clearInterval(this.heartbeatTimer);
+        this.handlers.onDeposed();
+    }
+
+    receive(message) {
+        if (message.type === 'hello') {
+            if (this.isLeader) {
+                this.heartbeat();
+            }
+        } else if (message.type === 'heartbeat') {
+            if (this.isLeader) {
+                if (message.id > this.id) {
+                    // Two leaders: this one stays, and the other steps down on hearing it
+                    this.heartbeat();
+                    return;
+                }
+                this.depose();
+            }
+            this.leader = message;
+            if (this.active) {
+                this.scheduleClaim(TAB_LEADER_TIMEOUT_MS);
+            }
+            this.handlers.onMessage(message);
+        } else if (message.type === 'resign') {
+            if (this.leader && this.leader.id === message.id) {
+                this.leader = null;
+            }
+            // Staggered so that one tab usually wins outright
+            if (this.active && !this.isLeader) {
+                this.scheduleClaim(Math.random() * TAB_CLAIM_DELAY_MS);
+            }
+        } else {
+            this.handlers.onMessage(message);
+        }
+    }
+}
@@ -0,0 +1,171 @@
+"""
+Per-sheet snapshot cache for the comprehensive dashboard
+Each sheet tab (tenant) keeps its own snapshot, delta history and search index;
+tenants are evicted least-recently-viewed first under a byte budget, and their
+number is capped so that sheets which never fetched (size 0) cannot pile up
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+class SheetTenant:
+    """Cached state for one sheet tab"""
+
+    def __init__(self, key, sheet_url):
+        self.key = key
+        self.sheet_url = sheet_url
+        self.data = None
+        self.last_update = None
+        self.version = 0
+        self.deltas = deque(maxlen=32)  # (version, base version, serialized delta or None)
+        # Built from the installed snapshot (columnar view, exports, ...): (version, {name: artifact}),
+        # replaced whole when a new version is installed
+        self.artifacts = (0, {})
+        self.search_index = None
+        self.search_index_version = 0
+        self.history = None
+        self.rolling = None
+        self.timeseries = None
+        self.archive = None
+        self.size = 0
+        self.created = time.time()
+        self.last_viewed = 0.0
+        self.subscribers = 0
+        self.revalidating = False
+        self.last_revalidate = 0.0
+        self.fetch_failed = False
+
+    def touch(self):
+        """Mark the tenant as viewed just now"""
+        self.last_viewed = time.time()
+
+    def is_active(self, viewer_ttl):
+        return self.subscribers > 0 or time.time() - self.last_viewed <= viewer_ttl
+
+    def is_empty(self):
+        """No snapshot was ever installed (not fetched yet, or every fetch failed)"""
+        return self.data is None and self.subscribers == 0
+
+class SheetTenantCache:
+    """LRU of sheet tenants with size-aware eviction under a memory budget"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, on_evict=None, max_tenants=100, empty_ttl=300):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.max_tenants = max_tenants
+        self.empty_ttl = empty_ttl
+        self.tenants = OrderedDict()  # key -> SheetTenant, least recently used first
+        self.total_bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            tenant = self.tenants.get(key)
+            if tenant is not None:
+                self.tenants.move_to_end(key)
+            return tenant
+
+    def get_or_create(self, key, sheet_url):
+        """The tenant for a sheet, or None if the cache is full of sheets with subscribers"""
+        evicted = []
+        with self.lock:
+            tenant = self.tenants.get(key)
+            if tenant is not None:
+                self.tenants.move_to_end(key)
+                return tenant
+            if len(self.tenants) >= self.max_tenants:
+                evicted = self._make_room()
+            if len(self.tenants) < self.max_tenants:
+                tenant = self.tenants[key] = SheetTenant(key, sheet_url)
+        self._notify(evicted)
+        return tenant
+
+    def _expired_empty(self):
+        now = time.time()
+        return [tenant for tenant in self.tenants.values() if tenant.is_empty() and now - tenant.created > self.empty_ttl]
+
+    def _make_room(self):
+        """Evict for one new tenant: expired empty tenants, else the LRU empty one, else the LRU idle one"""
+        evicted = self._remove(self._expired_empty())
+        if len(self.tenants) < self.max_tenants:
+            return evicted
+        # Sheets that never fetched go before ones with data, so unknown keys cannot push real sheets out
+        for candidates in ([tenant for tenant in self.tenants.values() if tenant.is_empty()],
+                           [tenant for tenant in self.tenants.values() if tenant.subscribers == 0]):
+            if candidates:
+                return evicted + self._remove(candidates[:1])
+        return evicted
+
+    def _remove(self, tenants):
+        for tenant in tenants:
+            del self.tenants[tenant.key]
+            self.total_bytes -= tenant.size
+            self.evictions += 1
+        return tenants
+
+    def _notify(self, evicted):
+        for candidate in evicted:
+            if self.on_evict:
+                self.on_evict(candidate)
+
+    def expire_empty(self):
+        """Drop tenants that are still empty empty_ttl seconds after they were created"""
+        with self.lock:
+            evicted = self._remove(self._expired_empty())
+        self._notify(evicted)
+        return evicted
+
+    def record_size(self, tenant, size):
+        """Account for a tenant's new snapshot size and evict others if over budget"""
+        evicted = []
+        with self.lock:
+            if self.tenants.get(tenant.key) is not tenant:
+                return []
+            self.total_bytes += size - tenant.size
+            tenant.size = size
+            self.tenants.move_to_end(tenant.key)
+
+            for key in list(self.tenants):
+                if self.total_bytes <= self.max_bytes:
+                    break
+                candidate = self.tenants[key]
+                # Never evict the tenant just published or one with live subscribers
+                if candidate is tenant or candidate.subscribers > 0:
+                    continue
+                del self.tenants[key]
+                self.total_bytes -= candidate.size
+                self.evictions += 1
+                evicted.append(candidate)
+
+        self._notify(evicted)
+        return evicted
+
+    def all_tenants(self):
+        with self.lock:
+            return list(self.tenants.values())
+
+    def active_tenants(self, viewer_ttl):
+        """Tenants with a subscriber or a view within viewer_ttl seconds"""
+        with self.lock:
+            return [tenant for tenant in self.tenants.values() if tenant.is_active(viewer_ttl)]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tenants': [
+                    {
+                        'key': tenant.key,
+                        'version': tenant.version,
+                        'bytes': tenant.size,
+                        'subscribers': tenant.subscribers,
+                        'last_viewed': tenant.last_viewed,
+                        'last_update': tenant.last_update.isoformat() if tenant.last_update else None
+                    }
+                    for tenant in self.tenants.values()
+                ],
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_tenants': self.max_tenants,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,350 @@
+"""
+Compressed long-term store for per-client, per-CM and per-bot metric history
+
+Points arrive once per refresh and go to an append-only head log. Each full
+hour is sealed into an immutable minute-tier chunk. As data ages it is
+compacted into hour-tier and then day-tier chunks (last sample per bucket,
+kept at the time it was taken; the stored counters are cumulative or gauges).
+
+Chunks are columnar. Per series, timestamps are stored as delta-of-delta and
+counters as deltas, all zigzag varints, and the chunk is then deflated. Each
+tier keeps a sparse index of chunk time ranges, so a range query opens only
+the chunks it overlaps.
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from bisect import bisect_right
+
+MEASURES = ('leads', 'calls', 'live_campaigns', 'total_campaigns')
+SERIES_GROUPS = {'client': 'client_performance', 'cm': 'cm_performance', 'bot': 'bot_performance'}
+
+# tier -> (bucket seconds, chunk span seconds, age after which it is compacted into the next tier)
+TIERS = {
+    'minute': (60, 3600, 7 * 86400),
+    'hour': (3600, 7 * 86400, 90 * 86400),
+    'day': (86400, 90 * 86400, None)
+}
+TIER_ORDER = ['minute', 'hour', 'day']
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+def write_varint(out, value):
+    value = zigzag(value)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, position):
+    result = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return unzigzag(result), position
+        shift += 7
+
+def encode_chunk(series):
+    """series: {key: [(timestamp, (measure values...)), ...]} sorted by time"""
+    out = bytearray()
+    write_varint(out, len(series))
+    for key, points in series.items():
+        name = key.encode('utf-8')
+        write_varint(out, len(name))
+        out += name
+        write_varint(out, len(points))
+
+        previous_time = previous_delta = 0
+        for timestamp, _ in points:
+            delta = int(timestamp) - previous_time
+            write_varint(out, delta - previous_delta)
+            previous_time, previous_delta = int(timestamp), delta
+
+        for index in range(len(MEASURES)):
+            previous = 0
+            for _, values in points:
+                write_varint(out, values[index] - previous)
+                previous = values[index]
+    return zlib.compress(bytes(out), 6)
+
+def decode_chunk(blob, wanted=None):
+    """Inverse of encode_chunk, optionally only for the series in wanted"""
+    data = zlib.decompress(blob)
+    series = {}
+    count, position = read_varint(data, 0)
+    for _ in range(count):
+        length, position = read_varint(data, position)
+        key = data[position:position + length].decode('utf-8')
+        position += length
+        points, position = read_varint(data, position)
+
+        timestamps = []
+        previous_time = previous_delta = 0
+        for _ in range(points):
+            delta_of_delta, position = read_varint(data, position)
+            previous_delta += delta_of_delta
+            previous_time += previous_delta
+            timestamps.append(previous_time)
+
+        columns = []
+        for _ in MEASURES:
+            column, previous = [], 0
+            for _ in range(points):
+                delta, position = read_varint(data, position)
+                previous += delta
+                column.append(previous)
+            columns.append(column)
+
+        if wanted is None or key in wanted:
+            series[key] = list(zip(timestamps, zip(*columns)))
+    return series
+
+def snapshot_series(metrics):
+    """Series values for one snapshot: the sheet total plus every client, CM and bot"""
+    series = {
+        'total:all': (
+            metrics.get('total_leads_dialled', 0),
+            metrics.get('total_connected_calls', 0),
+            metrics.get('live_campaigns', 0),
+            metrics.get('total_clients', 0)
+        )
+    }
+    for group, metrics_key in SERIES_GROUPS.items():
+        for name, performance in (metrics.get(metrics_key) or {}).items():
+            series[f'{group}:{name}'] = (
+                performance.get('leads', 0),
+                performance.get('calls', 0),
+                performance.get('live_campaigns', 0),
+                performance.get('total_campaigns', 0)
+            )
+    return series
+
+class TimeSeriesStore:
+    """Head log plus tiered, indexed chunk files under one directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        for tier in TIERS:
+            os.makedirs(os.path.join(directory, tier), exist_ok=True)
+
+    # -- index -------------------------------------------------------------
+
+    def index_path(self, tier):
+        return os.path.join(self.directory, tier, 'index.json')
+
+    def read_index(self, tier):
+        """Sorted [start, end, file, bytes] entries for a tier"""
+        try:
+            with open(self.index_path(tier)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def write_index(self, tier, entries):
+        entries.sort(key=lambda entry: entry[0])
+        temp_path = f'{self.index_path(tier)}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, self.index_path(tier))
+
+    def write_chunk(self, tier, start, series):
+        name = f'{int(start):012d}.chunk'
+        blob = encode_chunk(series)
+        path = os.path.join(self.directory, tier, name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(blob)
+        os.replace(path + '.tmp', path)
+
+        entries = [entry for entry in self.read_index(tier) if entry[2] != name]
+        entries.append([int(start), int(start + TIERS[tier][1]), name, len(blob)])
+        self.write_index(tier, entries)
+
+    # -- head log ------------------------------------------------------------
+
+    def head_path(self):
+        return os.path.join(self.directory, 'head.log')
+
+    def read_head(self):
+        points = []
+        try:
+            with open(self.head_path()) as f:
+                for line in f:
+                    try:
+                        points.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line from a crash mid-append
+                        continue
+        except OSError:
+            pass
+        return points
+
+    def append(self, metrics, timestamp=None):
+        """Record one snapshot; seals the head into a chunk when the hour rolls over"""
+        timestamp = int(timestamp or time.time())
+        span = TIERS['minute'][1]
+        with self.lock:
+            head = self.read_head()
+            if head and head[0]['t'] // span != timestamp // span:
+                self._seal(head)
+            with open(self.head_path(), 'a') as f:
+                f.write(json.dumps({'t': timestamp, 'v': snapshot_series(metrics)}, separators=(',', ':')) + '\n')
+
+    def _seal(self, head):
+        span = TIERS['minute'][1]
+        series = {}
+        for point in head:
+            for key, values in point['v'].items():
+                series.setdefault(key, []).append((point['t'], tuple(values)))
+        self.write_chunk('minute', head[0]['t'] // span * span, series)
+        os.remove(self.head_path())
+        self.compact()
+
+    # -- downsampling ---------------------------------------------------------
+
+    def compact(self, now=None):
+        """Roll chunks older than their tier's retention into the next, coarser tier"""
+        now = now or time.time()
+        for tier, coarser in zip(TIER_ORDER, TIER_ORDER[1:]):
+            retention = TIERS[tier][2]
+            expired = [entry for entry in self.read_index(tier) if entry[1] <= now - retention]
+            if not expired:
+                continue
+
+            bucket, chunk_span = TIERS[coarser][0], TIERS[coarser][1]
+            targets = {}
+            for entry in expired:
+                for key, points in self._load(tier, entry).items():
+                    for timestamp, values in points:
+                        chunk_start = timestamp // chunk_span * chunk_span
+                        # Last sample per bucket (counters are cumulative and gauges are point-in-time),
+                        # stamped with its own time so values_at never sees it before it was taken
+                        targets.setdefault(chunk_start, {}).setdefault(key, {})[timestamp // bucket * bucket] = (timestamp, values)
+
+            coarse_index = {entry[0]: entry for entry in self.read_index(coarser)}
+            for chunk_start, series in targets.items():
+                if chunk_start in coarse_index:
+                    # Merge into the existing coarse chunk for this span; the newly compacted data is later
+                    for key, points in self._load(coarser, coarse_index[chunk_start]).items():
+                        merged = {timestamp // bucket * bucket: (timestamp, values) for timestamp, values in points}
+                        merged.update(series.get(key, {}))
+                        series[key] = merged
+                self.write_chunk(coarser, chunk_start, {
+                    key: sorted(buckets.values()) for key, buckets in series.items()
+                })
+
+            remaining = [entry for entry in self.read_index(tier) if entry not in expired]
+            self.write_index(tier, remaining)
+            for entry in expired:
+                try:
+                    os.remove(os.path.join(self.directory, tier, entry[2]))
+                except OSError:
+                    pass
+
+    # -- queries --------------------------------------------------------------
+
+    def _load(self, tier, entry, wanted=None):
+        try:
+            with open(os.path.join(self.directory, tier, entry[2]), 'rb') as f:
+                return decode_chunk(f.read(), wanted)
+        except OSError:
+            return {}
+
+    def overlapping(self, tier, start, end):
+        """Index entries of a tier that overlap [start, end], found by bisecting the sparse index"""
+        entries = self.read_index(tier)
+        starts = [entry[0] for entry in entries]
+        first = max(bisect_right(starts, start) - 1, 0)
+        return [entry for entry in entries[first:] if entry[0] <= end and entry[1] > start]
+
+    def query(self, keys, start, end, tier=None):
+        """Points per series in [start, end]; finest tier available wins where tiers overlap"""
+        wanted = set(keys)
+        result = {key: [] for key in keys}
+        chunks_read = 0
+        covered_from = None  # earliest timestamp already answered by a finer tier
+
+        for current in ([tier] if tier else TIER_ORDER):
+            entries = self.overlapping(current, start, end)
+            tier_from = None
+            for entry in entries:
+                chunks_read += 1
+                for key, points in self._load(current, entry, wanted).items():
+                    for timestamp, values in points:
+                        if start <= timestamp <= end and (covered_from is None or timestamp < covered_from):
+                            result[key].append((timestamp, values))
+                tier_from = entry[0] if tier_from is None else min(tier_from, entry[0])
+
+            if current == 'minute':
+                for point in self.read_head():
+                    if start <= point['t'] <= end:
+                        for key in wanted.intersection(point['v']):
+                            result[key].append((point['t'], tuple(point['v'][key])))
+                        tier_from = point['t'] if tier_from is None else min(tier_from, point['t'])
+
+            if tier_from is not None:
+                covered_from = tier_from if covered_from is None else min(covered_from, tier_from)
+
+        for points in result.values():
+            points.sort(key=lambda point: point[0])
+        return result, chunks_read
+
+    def values_at(self, timestamp):
+        """Every series' last point at or before timestamp, and the number of chunks read
+
+        The head holds the newest points and each tier is older than the one
+        before it, so the first source with a point at or before timestamp wins.
+        Within a tier only the chunk covering timestamp (or the one before it,
+        if timestamp falls ahead of that chunk's first point) is opened.
+        """
+        latest = {}
+        for point in self.read_head():
+            if point['t'] <= timestamp:
+                for key, values in point['v'].items():
+                    latest[key] = (point['t'], tuple(values))
+        if latest:
+            return latest, 0
+
+        chunks_read = 0
+        for tier in TIER_ORDER:
+            entries = self.read_index(tier)
+            position = bisect_right([entry[0] for entry in entries], timestamp) - 1
+            for entry in entries[max(position - 1, 0):position + 1][::-1]:
+                chunks_read += 1
+                for key, points in self._load(tier, entry).items():
+                    before = [point for point in points if point[0] <= timestamp]
+                    if before:
+                        latest[key] = before[-1]
+                if latest:
+                    return latest, chunks_read
+        return latest, chunks_read
+
+    def oldest_timestamp(self):
+        """Time of the oldest retained point, or None when nothing was recorded"""
+        for tier in reversed(TIER_ORDER):
+            entries = self.read_index(tier)
+            if entries:
+                times = [points[0][0] for points in self._load(tier, entries[0]).values() if points]
+                if times:
+                    return min(times)
+        head = self.read_head()
+        return head[0]['t'] if head else None
+
+    def disk_usage(self):
+        usage = {}
+        for tier in TIERS:
+            entries = self.read_index(tier)
+            usage[tier] = {'chunks': len(entries), 'bytes': sum(entry[3] for entry in entries)}
+        try:
+            usage['head_bytes'] = os.path.getsize(self.head_path())
+        except OSError:
+            usage['head_bytes'] = 0
+        return usage